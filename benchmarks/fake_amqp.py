@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+In-process AMQP 0-9-1 broker stand-in, speaking the wire protocol with ``pika.frame``/``pika.spec``.
+
+It implements what the library uses: default, direct and fanout exchanges, queue
+declare/bind, publisher confirms, mandatory returns, ``basic_get``, consumers with
+prefetch, ack/reject/nack with requeue. Topic and headers exchanges route like
+direct ones. There is no persistence, authentication or heartbeats.
+
+.. code:: python
+
+    with FakeAmqpServer() as server:
+        RabbitMqPublisher(server.url, queue='queue_name').publish_message('hello')
+        print(server.broker.message_count('queue_name'))
+"""
+import logging
+import socket
+import struct
+from collections import OrderedDict, deque
+from itertools import count
+from threading import Lock, RLock, Thread
+
+from pika import frame, spec
+
+logger = logging.getLogger(__name__)
+
+FRAME_MAX = spec.FRAME_MAX_SIZE
+CAPABILITIES = {'publisher_confirms': True, 'basic.nack': True, 'consumer_cancel_notify': True,
+                'exchange_exchange_bindings': True, 'authentication_failure_close': True,
+                'connection.blocked': True}
+
+
+class Message:
+    __slots__ = ('exchange', 'routing_key', 'properties', 'body', 'redelivered')
+
+    def __init__(self, exchange, routing_key, properties, body):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.properties = properties
+        self.body = body
+        self.redelivered = False
+
+
+class Consumer:
+    __slots__ = ('channel', 'tag', 'queue', 'no_ack')
+
+    def __init__(self, channel, tag, queue, no_ack):
+        self.channel = channel
+        self.tag = tag
+        self.queue = queue
+        self.no_ack = no_ack
+
+
+class FakeBroker:
+
+    def __init__(self):
+        self.lock = RLock()
+        self.queues = {}
+        self.exchanges = {'': 'direct'}
+        self.bindings = {}
+        self.consumers = {}
+        self.consumer_tags = count(1)
+
+    def declare_queue(self, name):
+        if name not in self.queues:
+            self.queues[name] = deque()
+            self.consumers[name] = deque()
+        return name
+
+    def message_count(self, queue):
+        with self.lock:
+            return len(self.queues.get(queue, ()))
+
+    def route(self, exchange, routing_key):
+        if exchange == '':
+            return [routing_key] if routing_key in self.queues else []
+        fanout = self.exchanges.get(exchange) == 'fanout'
+        return [queue for key, queue in self.bindings.get(exchange, ()) if fanout or key == routing_key]
+
+    def enqueue(self, queue, message):
+        self.queues[queue].append(message)
+        self.dispatch(queue)
+
+    def requeue(self, queue, message):
+        message.redelivered = True
+        if queue in self.queues:
+            self.queues[queue].appendleft(message)
+
+    def dispatch(self, queue):
+        messages, consumers = self.queues[queue], self.consumers[queue]
+        while messages and consumers:
+            for _ in range(len(consumers)):
+                consumer = consumers[0]
+                consumers.rotate(-1)
+                if consumer.no_ack or consumer.channel.has_capacity():
+                    break
+            else:
+                return
+            consumer.channel.deliver(consumer, queue, messages.popleft())
+
+    def dispatch_all(self):
+        for queue in self.queues:
+            self.dispatch(queue)
+
+
+class ChannelState:
+
+    def __init__(self, session, number):
+        self.session = session
+        self.number = number
+        self.prefetch = 0
+        self.confirm = False
+        self.publish_tag = 0
+        self.delivery_tag = 0
+        self.unacked = OrderedDict()
+        self.consumers = {}
+        self.publishing = None
+
+    @property
+    def broker(self):
+        return self.session.broker
+
+    def has_capacity(self):
+        return not self.prefetch or len(self.unacked) < self.prefetch
+
+    def content_frames(self, method, message):
+        frames = [frame.Method(self.number, method),
+                  frame.Header(self.number, len(message.body), message.properties)]
+        step = self.session.frame_max - spec.FRAME_HEADER_SIZE - spec.FRAME_END_SIZE
+        for start in range(0, len(message.body), step):
+            frames.append(frame.Body(self.number, message.body[start:start + step]))
+        return frames
+
+    def deliver(self, consumer, queue, message):
+        self.delivery_tag += 1
+        if not consumer.no_ack:
+            self.unacked[self.delivery_tag] = (queue, message)
+        method = spec.Basic.Deliver(consumer.tag, self.delivery_tag, message.redelivered,
+                                    message.exchange, message.routing_key)
+        self.session.send(*self.content_frames(method, message))
+
+    def get(self, method):
+        self.broker.declare_queue(method.queue)
+        messages = self.broker.queues[method.queue]
+        if not messages:
+            return self.session.send(frame.Method(self.number, spec.Basic.GetEmpty()))
+        message = messages.popleft()
+        self.delivery_tag += 1
+        if not method.no_ack:
+            self.unacked[self.delivery_tag] = (method.queue, message)
+        reply = spec.Basic.GetOk(self.delivery_tag, message.redelivered, message.exchange, message.routing_key,
+                                 len(messages))
+        self.session.send(*self.content_frames(reply, message))
+
+    def settle(self, delivery_tag, multiple, requeue=None):
+        if multiple:
+            tags = [tag for tag in self.unacked if tag <= delivery_tag or not delivery_tag]
+        else:
+            tags = [delivery_tag] if delivery_tag in self.unacked else []
+        for tag in tags:
+            queue, message = self.unacked.pop(tag)
+            requeue and self.broker.requeue(queue, message)
+        self.broker.dispatch_all()
+
+    def published(self, message):
+        method = self.publishing
+        self.publishing = None
+        queues = self.broker.route(method.exchange, method.routing_key)
+        if not queues and method.mandatory:
+            self.session.send(*self.content_frames(
+                spec.Basic.Return(312, 'NO_ROUTE', method.exchange, method.routing_key), message))
+        for queue in queues:
+            self.broker.enqueue(queue, message)
+        if self.confirm:
+            self.publish_tag += 1
+            self.session.send(frame.Method(self.number, spec.Basic.Ack(self.publish_tag)))
+
+    def close(self):
+        for tag in list(self.consumers):
+            self.cancel(tag)
+        for queue, message in reversed(self.unacked.values()):
+            self.broker.requeue(queue, message)
+        self.unacked.clear()
+        self.broker.dispatch_all()
+
+    def cancel(self, tag):
+        consumer = self.consumers.pop(tag, None)
+        consumer and self.broker.consumers[consumer.queue].remove(consumer)
+
+    def handle_content(self, received):
+        if isinstance(received, frame.Header):
+            self.content_header = received
+            self.content_body = []
+            self.content_size = 0
+        else:
+            self.content_body.append(received.fragment)
+            self.content_size += len(received.fragment)
+        if self.content_size >= self.content_header.body_size:
+            self.published(Message(self.publishing.exchange, self.publishing.routing_key,
+                                   self.content_header.properties, b''.join(self.content_body)))
+
+    def handle(self, method):
+        reply = None
+        if isinstance(method, spec.Channel.Open):
+            reply = spec.Channel.OpenOk()
+        elif isinstance(method, spec.Channel.Close):
+            self.close()
+            self.session.channels.pop(self.number, None)
+            reply = spec.Channel.CloseOk()
+        elif isinstance(method, spec.Channel.CloseOk):
+            self.session.channels.pop(self.number, None)
+        elif isinstance(method, spec.Confirm.Select):
+            self.confirm = True
+            reply = spec.Confirm.SelectOk()
+        elif isinstance(method, spec.Exchange.Declare):
+            self.broker.exchanges.setdefault(method.exchange, method.type)
+            reply = spec.Exchange.DeclareOk()
+        elif isinstance(method, spec.Queue.Declare):
+            queue = self.broker.declare_queue(method.queue or 'amq.gen-{}'.format(next(self.broker.consumer_tags)))
+            reply = spec.Queue.DeclareOk(queue, len(self.broker.queues[queue]), len(self.broker.consumers[queue]))
+        elif isinstance(method, spec.Queue.Bind):
+            self.broker.bindings.setdefault(method.exchange, set()).add((method.routing_key, method.queue))
+            reply = spec.Queue.BindOk()
+        elif isinstance(method, spec.Basic.Qos):
+            self.prefetch = method.prefetch_count
+            reply = spec.Basic.QosOk()
+        elif isinstance(method, spec.Basic.Publish):
+            self.publishing = method
+        elif isinstance(method, spec.Basic.Get):
+            self.get(method)
+        elif isinstance(method, spec.Basic.Consume):
+            tag = method.consumer_tag or 'ctag-{}'.format(next(self.broker.consumer_tags))
+            self.broker.declare_queue(method.queue)
+            consumer = self.consumers[tag] = Consumer(self, tag, method.queue, method.no_ack)
+            self.session.send(frame.Method(self.number, spec.Basic.ConsumeOk(tag)))
+            self.broker.consumers[method.queue].append(consumer)
+            self.broker.dispatch(method.queue)
+        elif isinstance(method, spec.Basic.Cancel):
+            self.cancel(method.consumer_tag)
+            reply = spec.Basic.CancelOk(method.consumer_tag)
+        elif isinstance(method, spec.Basic.Ack):
+            self.settle(method.delivery_tag, method.multiple)
+        elif isinstance(method, spec.Basic.Reject):
+            self.settle(method.delivery_tag, False, method.requeue)
+        elif isinstance(method, spec.Basic.Nack):
+            self.settle(method.delivery_tag, method.multiple, method.requeue)
+        else:
+            logger.warning('Fake broker ignoring %r', method)
+
+        if reply is not None and not getattr(method, 'nowait', False):
+            self.session.send(frame.Method(self.number, reply))
+
+
+class Session(Thread):
+
+    def __init__(self, broker, sock):
+        super(Session, self).__init__(name='fake-amqp-session', daemon=True)
+        self.broker = broker
+        self.sock = sock
+        self.frame_max = FRAME_MAX
+        self.channels = {}
+        self.send_lock = Lock()
+        self.closed = False
+
+    def send(self, *frames):
+        data = b''.join(item.marshal() for item in frames)
+        with self.send_lock:
+            if self.closed:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.closed = True
+
+    def frames(self):
+        buffer = bytearray()
+        header_size = spec.FRAME_HEADER_SIZE
+        while True:
+            data = self.sock.recv(1 << 16)
+            if not data:
+                return
+            buffer += data
+            if buffer[:4] == b'AMQP' and len(buffer) >= 8:
+                del buffer[:8]
+                yield frame.ProtocolHeader()
+            while len(buffer) >= header_size:
+                frame_end = header_size + struct.unpack_from('>L', buffer, 3)[0] + spec.FRAME_END_SIZE
+                if len(buffer) < frame_end:
+                    break
+                _, received = frame.decode_frame(bytes(buffer[:frame_end]))
+                del buffer[:frame_end]
+                yield received
+
+    def run(self):
+        try:
+            for received in self.frames():
+                with self.broker.lock:
+                    if not self.handle(received):
+                        return
+        except OSError:
+            pass
+        finally:
+            with self.broker.lock:
+                for channel in self.channels.values():
+                    channel.close()
+                self.channels.clear()
+            self.closed = True
+            self.sock.close()
+
+    def handle(self, received):
+        if isinstance(received, frame.ProtocolHeader):
+            self.send(frame.Method(0, spec.Connection.Start(server_properties=dict(
+                product='queue_manager fake broker', capabilities=CAPABILITIES))))
+        elif isinstance(received, frame.Heartbeat):
+            pass
+        elif received.channel_number == 0:
+            method = received.method
+            if isinstance(method, spec.Connection.StartOk):
+                self.send(frame.Method(0, spec.Connection.Tune(2047, FRAME_MAX, 0)))
+            elif isinstance(method, spec.Connection.TuneOk):
+                self.frame_max = method.frame_max or FRAME_MAX
+            elif isinstance(method, spec.Connection.Open):
+                self.send(frame.Method(0, spec.Connection.OpenOk()))
+            elif isinstance(method, spec.Connection.Close):
+                self.send(frame.Method(0, spec.Connection.CloseOk()))
+                return False
+        elif isinstance(received, frame.Method):
+            if received.channel_number not in self.channels:
+                self.channels[received.channel_number] = ChannelState(self, received.channel_number)
+            self.channels[received.channel_number].handle(received.method)
+        else:
+            self.channels[received.channel_number].handle_content(received)
+        return True
+
+
+class FakeAmqpServer:
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.broker = FakeBroker()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.host, self.port = self.sock.getsockname()
+        self.sessions = []
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'amqp://guest:guest@{}:{}/%2F'.format(self.host, self.port)
+
+    def start(self):
+        self.sock.listen(128)
+        self._thread = Thread(target=self.serve, name='fake-amqp', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = Session(self.broker, client)
+            self.sessions = [alive for alive in self.sessions if not alive.closed] + [session]
+            session.start()
+
+    def stop(self):
+        for sock in [self.sock] + [session.sock for session in self.sessions]:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.sock.close()
+        self._thread is not None and self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Cold import time of the package and of each backend, every sample in a new interpreter.
+
+::
+
+    $ python -m benchmarks.import_time
+    # exits with 1 when ``import queue_manager`` takes longer than the budget
+    $ python -m benchmarks.import_time --modules queue_manager --max-ms 20
+
+The output is JSON: ``{"meta": {...}, "results": [{"module", "samples", "median_ms", "min_ms"}]}``,
+times leave out the interpreter startup.
+"""
+import json
+import platform
+import subprocess
+import sys
+from argparse import ArgumentParser
+from statistics import median
+
+MODULES = (
+    'queue_manager',
+    'queue_manager.memory_broker',
+    'queue_manager.rabbitmq_publisher',
+    'queue_manager.rabbitmq_consumer',
+    'queue_manager.tornado_consumer',
+    'queue_manager.pubsub_publisher',
+    'queue_manager.pubsub_consumer',
+)
+
+SCRIPT = 'from time import perf_counter; started = perf_counter(); import {}; print(perf_counter() - started)'
+
+
+def import_time(module):
+    """Seconds ``import module`` takes in a new interpreter, ``None`` when it cannot be imported."""
+    process = subprocess.run([sys.executable, '-c', SCRIPT.format(module)],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return None if process.returncode else float(process.stdout)
+
+
+def main(args=None):
+    parser = ArgumentParser(description='Measure cold import times')
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=50, help='budget of "import queue_manager"')
+    options = parser.parse_args(args)
+
+    results = []
+    for module in options.modules:
+        samples = [sample for sample in (import_time(module) for _ in range(options.samples)) if sample is not None]
+        if not samples:
+            print('{:<40} not importable'.format(module), file=sys.stderr)
+            continue
+        results.append(dict(module=module, samples=len(samples), median_ms=round(median(samples) * 1000, 3),
+                            min_ms=round(min(samples) * 1000, 3)))
+        print('{module:<40} {median_ms:>10} ms'.format(**results[-1]), file=sys.stderr)
+
+    json.dump(dict(meta=dict(python=platform.python_version(), implementation=platform.python_implementation(),
+                             platform=platform.platform()), results=results), sys.stdout, indent=2)
+    package = next((item for item in results if item['module'] == 'queue_manager'), None)
+    if package and package['median_ms'] > options.max_ms:
+        print('import queue_manager took {} ms, over the {} ms budget'.format(package['median_ms'], options.max_ms),
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
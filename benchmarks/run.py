@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Throughput (messages/s) and latency (p50/p99) benchmarks, against the in-process
+:mod:`benchmarks.fake_amqp` broker unless ``--url`` points to a real one.
+
+::
+
+    $ python -m benchmarks.run --messages 2000 --sizes 128 65536 --concurrency 1 8 --output baseline.json
+    # after a change, exits with 1 when a result got more than 10% slower
+    $ python -m benchmarks.run --compare baseline.json --threshold 0.1
+
+The output is JSON: ``{"meta": {...}, "results": [{"benchmark", "payload_size", "concurrency",
+"messages", "seconds", "messages_per_second", "p50_ms", "p99_ms"}]}``.
+"""
+import json
+import logging
+import platform
+import struct
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Event, Thread
+from time import perf_counter
+from uuid import uuid4
+
+import pika
+
+from benchmarks.fake_amqp import FakeAmqpServer
+from queue_manager.queue_manager import QueueManager
+from queue_manager.rabbitmq_consumer import RabbitMqConsumer
+from queue_manager.rabbitmq_publisher import RabbitMqPublisher
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP = struct.Struct('d')
+
+
+def percentile(samples, percent):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, round(percent / 100 * (len(samples) - 1)))]
+
+
+def result(benchmark, payload_size, concurrency, messages, seconds, latencies):
+    return dict(benchmark=benchmark, payload_size=payload_size, concurrency=concurrency, messages=messages,
+                seconds=round(seconds, 6), messages_per_second=round(messages / seconds, 2) if seconds else None,
+                p50_ms=round(percentile(latencies, 50) * 1000, 4) if latencies else None,
+                p99_ms=round(percentile(latencies, 99) * 1000, 4) if latencies else None)
+
+
+def payload(size):
+    return b'x' * size
+
+
+def stamped(size):
+    """Body carrying its send time, for end to end latency."""
+    return TIMESTAMP.pack(perf_counter()) + b'x' * max(size - TIMESTAMP.size, 0)
+
+
+def queue_name(benchmark):
+    return '{}-{}'.format(benchmark, uuid4().hex[:8])
+
+
+def timed_calls(call, messages, concurrency):
+    """Run ``call(index)`` ``messages`` times over ``concurrency`` threads, returns elapsed time and latencies."""
+    def worker(indexes):
+        latencies = []
+        for index in indexes:
+            started = perf_counter()
+            call(index)
+            latencies.append(perf_counter() - started)
+        return latencies
+
+    chunks = [range(start, messages, concurrency) for start in range(concurrency)]
+    started = perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = [latency for chunk in executor.map(worker, chunks) for latency in chunk]
+    return perf_counter() - started, latencies
+
+
+def bench_publish_message(url, size, concurrency, messages):
+    """One publisher per thread, each publish opens its own connection."""
+    queue = queue_name('publish')
+    publishers = [RabbitMqPublisher(url, queue=queue) for _ in range(concurrency)]
+    body = payload(size)
+    seconds, latencies = timed_calls(lambda index: publishers[index % concurrency].publish_message(body),
+                                     messages, concurrency)
+    return result('publish_message', size, concurrency, messages, seconds, latencies)
+
+
+def bench_publish_message_pooled(url, size, concurrency, messages):
+    queue = queue_name('publish-pooled')
+    publisher = RabbitMqPublisher(url, queue=queue, pool_size=concurrency)
+    body = payload(size)
+    try:
+        publisher.publish_message(body)
+        seconds, latencies = timed_calls(lambda index: publisher.publish_message(body), messages, concurrency)
+    finally:
+        publisher.close()
+    return result('publish_message_pooled', size, concurrency, messages, seconds, latencies)
+
+
+def bench_publish_batch(url, size, concurrency, messages):
+    queue = queue_name('publish-batch')
+    publisher = RabbitMqPublisher(url, queue=queue)
+    body = payload(size)
+    started = perf_counter()
+    publisher.publish_batch([body] * messages, max_outstanding=max(concurrency, 1) * 100)
+    return result('publish_batch', size, concurrency, messages, perf_counter() - started, [])
+
+
+def bench_queue_manager(url, size, concurrency, messages, keep_alive):
+    queue = queue_name('queue-manager')
+    managers = [QueueManager(dict(urls=[url]), keep_alive=keep_alive) for _ in range(concurrency)]
+    body = payload(size)
+    name = 'queue_manager_{}'.format('keep_alive' if keep_alive else 'connect')
+    try:
+        seconds, latencies = timed_calls(lambda index: managers[index % concurrency].push(queue, body),
+                                         messages, concurrency)
+        pushed = result(name + '_push', size, concurrency, messages, seconds, latencies)
+        seconds, latencies = timed_calls(lambda index: managers[index % concurrency].pop(queue),
+                                         messages, concurrency)
+        popped = result(name + '_pop', size, concurrency, messages, seconds, latencies)
+    finally:
+        # QueueManager disconnects when collected
+        managers.clear()
+    return [pushed, popped]
+
+
+def bench_consumer(name, url, size, concurrency, messages, consumer_class, run):
+    """Publish stamped messages while the consumer receives them, latency is publish to callback."""
+    queue = queue_name(consumer_class.__name__)
+    consumer = consumer_class(url, queue=queue, prefetch_count=max(concurrency, 1) * 10,
+                              worker_pool='thread' if concurrency > 1 else None)
+    latencies = []
+    done = Event()
+
+    def stop():
+        consumer._closing = True
+        consumer.stop_consuming()
+
+    def callback(body, properties):
+        latencies.append(perf_counter() - TIMESTAMP.unpack_from(body)[0])
+        if len(latencies) == messages and not done.is_set():
+            done.set()
+            consumer.add_callback_threadsafe(stop)
+
+    listener = Thread(target=run, args=(consumer, callback), daemon=True)
+    listener.start()
+
+    publisher = RabbitMqPublisher(url, queue=queue, pool_size=1)
+    started = perf_counter()
+    for _ in range(messages):
+        publisher.publish_message(stamped(size))
+    if not done.wait(60):
+        raise TimeoutError('{} received {} of {} messages'.format(name, len(latencies), messages))
+    seconds = perf_counter() - started
+    publisher.close()
+    listener.join(10)
+    return result(name, size, concurrency, messages, seconds, latencies)
+
+
+def run_select_consumer(consumer, callback):
+    consumer.start_listening(callback)
+    consumer.close_connection()
+    consumer._connection.ioloop.start()
+
+
+def run_tornado_consumer(consumer, callback):
+    import asyncio
+    from tornado.ioloop import IOLoop
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    consumer.start_listening(callback)
+    IOLoop.current().start()
+    consumer.close_connection()
+    IOLoop.current().start()
+
+
+def bench_tornado_consumer(url, size, concurrency, messages):
+    from queue_manager.tornado_consumer import TornadoConsumer
+    return bench_consumer('tornado_consumer', url, size, concurrency, messages, TornadoConsumer, run_tornado_consumer)
+
+
+BENCHMARKS = dict(
+    publish_message=bench_publish_message,
+    publish_message_pooled=bench_publish_message_pooled,
+    publish_batch=bench_publish_batch,
+    queue_manager_connect=lambda *args: bench_queue_manager(*args, keep_alive=False),
+    queue_manager_keep_alive=lambda *args: bench_queue_manager(*args, keep_alive=True),
+    rabbitmq_consumer=lambda *args: bench_consumer('rabbitmq_consumer', *args, RabbitMqConsumer, run_select_consumer),
+    tornado_consumer=bench_tornado_consumer,
+)
+
+
+def compare(results, baseline, threshold):
+    """Print the change of each result against ``baseline``, returns the regressed ones."""
+    previous = {(item['benchmark'], item['payload_size'], item['concurrency']): item for item in baseline['results']}
+    regressions = []
+    for item in results:
+        before = previous.get((item['benchmark'], item['payload_size'], item['concurrency']))
+        if not before or not before['messages_per_second'] or not item['messages_per_second']:
+            continue
+        ratio = item['messages_per_second'] / before['messages_per_second']
+        regressed = ratio < 1 - threshold
+        regressed and regressions.append(item)
+        print('{benchmark:<40} {payload_size:>8}B x{concurrency:<3} {ratio:7.2%}{flag}'.format(
+            ratio=ratio, flag='  REGRESSION' if regressed else '', **item), file=sys.stderr)
+    return regressions
+
+
+def main(args=None):
+    parser = ArgumentParser(description='Benchmark publishers and consumers')
+    parser.add_argument('--url', help='broker url, defaults to an in-process fake broker')
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[128, 4096, 65536])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.1, help='tolerated slowdown when comparing')
+    options = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+    server = None if options.url else FakeAmqpServer().start()
+    url = options.url or server.url
+    results = []
+    try:
+        for name in options.benchmarks:
+            for size in options.sizes:
+                for concurrency in options.concurrency:
+                    outcome = BENCHMARKS[name](url, size, concurrency, options.messages)
+                    for item in outcome if isinstance(outcome, list) else [outcome]:
+                        print('{benchmark:<40} {payload_size:>8}B x{concurrency:<3} {messages_per_second:>12} msg/s '
+                              'p50 {p50_ms} ms p99 {p99_ms} ms'.format(**item), file=sys.stderr)
+                        results.append(item)
+    finally:
+        server and server.stop()
+
+    report = dict(meta=dict(timestamp=datetime.now(timezone.utc).isoformat(), python=platform.python_version(),
+                            implementation=platform.python_implementation(), platform=platform.platform(),
+                            pika=pika.__version__, broker=options.url and 'external' or 'fake'),
+                  results=results)
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if options.compare:
+        with open(options.compare) as baseline:
+            if compare(results, json.load(baseline), options.threshold):
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,116 @@
+"""
+The backends load on first access, ``import queue_manager`` does not import pika,
+tornado nor google-cloud-pubsub.
+
+.. code:: python
+
+    from queue_manager import RabbitMqPublisher  # imports queue_manager.rabbitmq_publisher (and pika) only now
+"""
+import logging
 from abc import ABCMeta
+from functools import partial
+from importlib import import_module
+from inspect import signature
+
+logger = logging.getLogger(__name__)
+
+_lazy_attributes = dict(
+    AsyncioConsumer='queue_manager.asyncio_consumer',
+    AsyncioPublisher='queue_manager.asyncio_publisher',
+    BackgroundPublisher='queue_manager.background_publisher',
+    ConsumerSupervisor='queue_manager.supervisor',
+    MemoryBroker='queue_manager.memory_broker',
+    MemoryConsumer='queue_manager.memory_broker',
+    MemoryPublisher='queue_manager.memory_broker',
+    MultiQueueConsumer='queue_manager.multi_queue_consumer',
+    PubsubConsumer='queue_manager.pubsub_consumer',
+    PubsubPublisher='queue_manager.pubsub_publisher',
+    PubsubRoutingPublisher='queue_manager.pubsub_publisher',
+    QueueManager='queue_manager.queue_manager',
+    RabbitMqConsumer='queue_manager.rabbitmq_consumer',
+    RabbitMqPublisher='queue_manager.rabbitmq_publisher',
+    RabbitMqRoutingPublisher='queue_manager.rabbitmq_publisher',
+    ReconnectStrategy='queue_manager.reconnect',
+    SpoolingPublisher='queue_manager.spool',
+    TornadoConsumer='queue_manager.tornado_consumer',
+)
+
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(import_module(_lazy_attributes[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
 
 
 class QueuePublisher(metaclass=ABCMeta):
+    metrics = None
+    codec = None
+    compression = None
+    compression_threshold = 1024
+
     def ping(self) -> bool:
         raise NotImplementedError()
 
     def publish_message(self, message, message_properties=None):
         raise NotImplementedError()
 
+    def encode_message(self, message):
+        """Returns the message body, its content type and content encoding, ``None`` when not set."""
+        content_type = None
+        if self.codec is not None:
+            message, content_type = self.codec.encode(message), self.codec.content_type
+        if self.compression is None:
+            return message, content_type, None
+        from queue_manager.compression import compress
+        message, content_encoding = compress(message, self.compression, self.compression_threshold)
+        return message, content_type, content_encoding
+
+    @staticmethod
+    def encoded_properties(message_properties, content_type, content_encoding):
+        """
+        Returns the properties of an encoded message, the content type of the codec and the
+        content encoding of the compression win over those of ``message_properties``.
+        """
+        encoded = {name: value for name, value in (('content_type', content_type),
+                                                   ('content_encoding', content_encoding)) if value is not None}
+        if not encoded:
+            return message_properties
+        return {**(message_properties or {}), **encoded}
+
+
+def _call_without_properties(callback, message, properties):
+    return callback(message)
+
 
 class QueueConsumer(metaclass=ABCMeta):
+    metrics = None
+    codec = None
+
     def ping(self) -> bool:
         raise NotImplementedError()
 
     def start_listening(self, callback=None):
         raise NotImplementedError()
+
+    @staticmethod
+    def validate_callback(callback):
+        """Returns the callback taking ``(message, properties)``, wrapping one without a properties parameter."""
+        if 'properties' not in signature(callback).parameters:
+            logger.warning('properties parameter missing on callback signature')
+            return partial(_call_without_properties, callback)
+        return callback
+
+    def decode_message(self, body, content_type=None, content_encoding=None):
+        if content_encoding:
+            from queue_manager.compression import decompress
+            body = decompress(body, content_encoding)
+        if self.codec is None:
+            return body
+        from queue_manager.serialization import decode
+        return decode(body, content_type, self.codec)
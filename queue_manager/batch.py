@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for consumers running on batch mode.
+
+A batch callback that processed only part of the messages raises
+:class:`BatchFailed` with the indexes that failed, only those are rejected.
+
+.. code:: python
+
+    def callback(messages):
+        failed = [index for index, message in enumerate(messages) if not save(message)]
+        if failed:
+            raise BatchFailed(failed)
+
+Publishers sending batches report the outcome of each message on a :class:`PublishBatchResult`.
+Messages still unconfirmed when the batch timed out are ``timed_out``, not ``nacked``: they
+may be published yet, so retrying them can publish them twice.
+"""
+from collections import namedtuple
+
+PublishBatchResult = namedtuple('PublishBatchResult', ('confirmed', 'nacked', 'returned', 'timed_out'),
+                                defaults=((),))
+
+
+class BatchFailed(Exception):
+
+    def __init__(self, failed, message=None):
+        super().__init__(message or 'Failed to process {} messages of the batch'.format(len(failed)))
+        self.failed = failed
+
+
+def failed_indexes(error, size):
+    if error is None:
+        return set()
+    if isinstance(error, BatchFailed):
+        return set(error.failed)
+    return set(range(size))
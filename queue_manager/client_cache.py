@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Process wide cache of clients and credentials.
+
+Like :data:`queue_manager.topology.topology_cache`, one instance is shared by the
+whole process: :class:`PubsubPublisher` and :class:`PubsubConsumer` instances with
+the same project, service account and client options share one credential object
+and one client (so one gRPC channel and its threads). Clients are reference counted
+and closed when the last instance releasing them is closed.
+
+.. code:: python
+
+    from queue_manager.client_cache import client_cache
+
+    client = client_cache.acquire(('publisher', 'project_id', 'path/to/sa.json'), create_client, close_client)
+    ...
+    client_cache.release(('publisher', 'project_id', 'path/to/sa.json'))
+"""
+import logging
+from threading import RLock
+
+logger = logging.getLogger(__name__)
+
+
+class ClientCache:
+
+    def __init__(self):
+        self._credentials = {}
+        self._clients = {}
+        self._lock = RLock()
+
+    def credentials(self, key, load):
+        """The credentials of ``key``, loaded once with ``load()``, they refresh their own tokens."""
+        with self._lock:
+            if key not in self._credentials:
+                self._credentials[key] = load()
+            return self._credentials[key]
+
+    def acquire(self, key, create, close=None):
+        """The client of ``key``, created with ``create()`` when no instance holds it."""
+        with self._lock:
+            if key in self._clients:
+                self._clients[key][1] += 1
+                return self._clients[key][0]
+            logger.debug('Creating client %s', key[0])
+            client = create()
+            self._clients[key] = [client, 1, close]
+            return client
+
+    def release(self, key):
+        """Drop a reference to the client of ``key``, closing it with the last one."""
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1]:
+                return
+            del self._clients[key]
+        client, _, close = entry
+        logger.debug('Closing client %s', key[0])
+        if close is not None:
+            close(client)
+
+    def references(self, key):
+        return self._clients[key][1] if key in self._clients else 0
+
+    def clear(self):
+        """Forget every credential and client, without closing them."""
+        with self._lock:
+            self._credentials.clear()
+            self._clients.clear()
+
+
+client_cache = ClientCache()
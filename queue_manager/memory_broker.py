@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+In-process broker with the :class:`QueuePublisher`/:class:`QueueConsumer` interface,
+for tests and single host pipelines.
+
+Queues are bounded, consumers hold at most ``prefetch_count`` unacked messages and
+settle them like :class:`RabbitMqConsumer`: acked when the callback returns, requeued
+once when it raises and rejected when it fails again on the redelivery.
+
+.. code:: python
+
+    from queue_manager.memory_broker import MemoryBroker, MemoryConsumer, MemoryPublisher
+
+    broker = MemoryBroker(maxsize=10000)
+    publisher = MemoryPublisher('queue_name', broker=broker, codec='json')
+    publisher.publish_message({'hello': 'world'})
+
+    consumer = MemoryConsumer('queue_name', broker=broker, prefetch_count=4, codec='auto')
+    consumer.start_listening(print)
+
+    # or sharing the queues with processes started after the broker, through multiprocessing queues
+    def consume(broker):
+        MemoryConsumer('queue_name', broker=broker).start_listening(print)
+
+    broker = MemoryBroker(transport='process')
+    broker.queue('queue_name')
+    Process(target=consume, args=(broker,)).start()
+"""
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full
+from threading import BoundedSemaphore, Condition, Lock
+from time import monotonic
+
+from queue_manager import QueueConsumer, QueuePublisher
+from queue_manager.batch import PublishBatchResult
+from queue_manager.compression import get_compressor
+from queue_manager.serialization import get_codec
+
+logger = logging.getLogger(__name__)
+
+
+class LocalQueue:
+    """Bounded FIFO shared by the threads of a process, ``bytes``/``memoryview`` bodies are not copied."""
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.messages = deque()
+        self.condition = Condition()
+
+    def put(self, item, block=True, timeout=None):
+        with self.condition:
+            if self.maxsize and not self.condition.wait_for(lambda: len(self.messages) < self.maxsize,
+                                                            timeout if block else 0):
+                raise Full()
+            self.messages.append(item)
+            self.condition.notify_all()
+
+    def requeue(self, item):
+        # like RabbitMQ, requeued messages go back to the head and ignore the bound
+        with self.condition:
+            self.messages.appendleft(item)
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.messages, timeout):
+                raise Empty()
+            item = self.messages.popleft()
+            self.condition.notify_all()
+            return item
+
+    def qsize(self):
+        return len(self.messages)
+
+
+class ProcessQueue:
+    """Bounded FIFO shared between processes, bodies are pickled through a pipe."""
+
+    def __init__(self, maxsize=0):
+        self.queue = multiprocessing.Queue(maxsize)
+
+    def put(self, item, block=True, timeout=None):
+        body, properties, redelivered = item
+        if not isinstance(body, bytes):
+            body = bytes(body)
+        self.queue.put((body, properties, redelivered), block, timeout)
+
+    def requeue(self, item):
+        # multiprocessing queues only append, requeued messages go to the tail
+        self.queue.put(item)
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+    def qsize(self):
+        return self.queue.qsize()
+
+
+class MemoryBroker:
+    transports = dict(thread=LocalQueue, process=ProcessQueue)
+
+    def __init__(self, maxsize=0, transport='thread'):
+        if transport not in self.transports:
+            raise ValueError('Invalid transport {!r}, use "thread" or "process"'.format(transport))
+        self.maxsize = maxsize
+        self.transport = transport
+        self.queues = {}
+        self._lock = Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _lock=Lock())
+
+    def queue(self, name):
+        """Declare the queue ``name``, process transport queues must be declared before forking."""
+        if name not in self.queues:
+            with self._lock:
+                if name not in self.queues:
+                    self.queues[name] = self.transports[self.transport](self.maxsize)
+        return self.queues[name]
+
+    def publish(self, queue, body, properties=None, block=True, timeout=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.queue(queue).put((body, properties or {}, False), block, timeout)
+
+    def message_count(self, queue):
+        return self.queue(queue).qsize()
+
+
+default_broker = MemoryBroker()
+
+
+class MemoryPublisher(QueuePublisher):
+
+    def __init__(self, queue, broker=None, block=True, timeout=None,
+                 codec=None, compression=None, compression_threshold=1024, metrics=None):
+        self.queue = queue
+        self.broker = broker or default_broker
+        self.block = block
+        self.timeout = timeout
+        self.codec = get_codec(codec)
+        self.compression = get_compressor(compression)
+        self.compression_threshold = compression_threshold
+        self.metrics = metrics
+
+    def ping(self):
+        return True
+
+    def publish_message(self, message, message_properties=None):
+        """Raises :class:`queue.Full` when the queue stays full for ``timeout`` (or at once if not ``block``)."""
+        started = monotonic()
+        body, content_type, content_encoding = self.encode_message(message)
+        message_properties = self.encoded_properties(message_properties, content_type, content_encoding)
+        self.broker.publish(self.queue, body, message_properties, self.block, self.timeout)
+        if self.metrics is not None:
+            self.metrics.observe('publish_seconds', monotonic() - started)
+        return True
+
+    def publish_batch(self, messages, max_outstanding=None):
+        confirmed, nacked = [], []
+        for entry in messages:
+            message, message_properties = entry if isinstance(entry, tuple) else (entry, None)
+            try:
+                self.publish_message(message, message_properties)
+            except Full:
+                nacked.append(entry)
+            else:
+                confirmed.append(entry)
+        return PublishBatchResult(confirmed, nacked, [])
+
+    publish_many = publish_batch
+
+
+class MemoryConsumer(QueueConsumer):
+    callback = None
+
+    def __init__(self, queue, broker=None, prefetch_count=1, codec=None, metrics=None, poll_interval=0.1):
+        self.queue = queue
+        self.broker = broker or default_broker
+        self.prefetch_count = prefetch_count
+        self.codec = get_codec(codec, allow_auto=True)
+        self.metrics = metrics
+        self.poll_interval = poll_interval
+        self._closing = False
+        self._capacity = None
+
+    def ping(self):
+        return True
+
+    def start_listening(self, callback=print):
+        """Consume until :meth:`stop`, running callbacks on ``prefetch_count`` threads when it is above 1."""
+        self.callback = self.validate_callback(self.callback or callback)
+        self._closing = False
+        self._capacity = BoundedSemaphore(self.prefetch_count)
+        queue = self.broker.queue(self.queue)
+        executor = ThreadPoolExecutor(self.prefetch_count) if self.prefetch_count > 1 else None
+        try:
+            while not self._closing:
+                if not self._capacity.acquire(timeout=self.poll_interval):
+                    continue
+                try:
+                    item = queue.get(timeout=self.poll_interval)
+                except Empty:
+                    self._capacity.release()
+                    continue
+                if executor is None:
+                    self.on_message(queue, item)
+                else:
+                    executor.submit(self.on_message, queue, item)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+    def on_message(self, queue, item):
+        body, properties, redelivered = item
+        try:
+            message = self.decode_message(body, properties.get('content_type'), properties.get('content_encoding'))
+        except Exception as e:
+            logger.error('Could not decode message: %r', e)
+            return self.reject_message(queue, item, False)
+        started = monotonic()
+        try:
+            self.callback(message, properties)
+            self.acknowledge_message()
+        except KeyboardInterrupt as e:
+            self.reject_message(queue, item)
+            raise e
+        except Exception as e:
+            logger.exception(e)
+            self.reject_message(queue, item, not redelivered)
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('callback_seconds', monotonic() - started)
+
+    def acknowledge_message(self):
+        self._capacity.release()
+        if self.metrics is not None:
+            self.metrics.increment('messages_acked')
+
+    def reject_message(self, queue, item, requeue=True):
+        if requeue:
+            body, properties, _ = item
+            queue.requeue((body, properties, True))
+        self._capacity.release()
+        if self.metrics is not None:
+            self.metrics.increment('messages_requeued' if requeue else 'messages_rejected')
+
+    def stop(self):
+        logger.info('Stopping')
+        self._closing = True
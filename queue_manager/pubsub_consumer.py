@@ -11,17 +11,47 @@
         consumer.start_listening(callback)
     except KeyboardInterrupt:
         consumer.stop()
+
+    # or receiving up to 100 messages at once, waiting at most 500 milliseconds for them
+    consumer = PubsubConsumer('project_id', 'path/to/sa.json', 'subscription_name', 'topic_name',
+                              batch_size=100, batch_timeout=500)
+
+    # or leasing up to 100 messages, processed by 20 threads, or by 8 processes for CPU heavy callbacks
+    consumer = PubsubConsumer('project_id', 'path/to/sa.json', 'subscription_name', 'topic_name',
+                              max_messages=100, executor_workers=20, process_pool=8)
+
+    # or draining the backlog with synchronous pulls, acking each batch with a single request
+    for messages in consumer.iter_batches(max_messages=500):
+        print("message bodies", messages)
+    # or
+    consumer.drain(batch_callback, max_messages=500)
+
+    # or decoding bodies by their content_type attribute, see queue_manager.serialization
+    consumer = PubsubConsumer('project_id', 'path/to/sa.json', 'subscription_name', 'topic_name', codec='auto')
+
+    # or acking redeliveries of processed messages without calling back, see queue_manager.dedup
+    consumer = PubsubConsumer('project_id', 'path/to/sa.json', 'subscription_name', 'topic_name',
+                              dedup=MemoryDedupStore(ttl=3600))
 """
 from collections.abc import Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from logging import getLogger
+from threading import Lock, Timer
+from time import monotonic
 
 from . import QueueConsumer
+from .batch import failed_indexes
+from .client_cache import client_cache
+from .dedup import message_key
+from .serialization import get_codec
+from .topology import freeze
 
 try:
     import google
     from google.api_core.exceptions import GoogleAPICallError
     from google.cloud import pubsub
     from google.oauth2.service_account import Credentials
+    from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
     from google.cloud.pubsub_v1.types import FlowControl
 except ModuleNotFoundError:
     raise ModuleNotFoundError("You need to install google-cloud-pubsub")
@@ -32,32 +62,159 @@ logger = getLogger(__name__)
 class PubsubConsumer(QueueConsumer):
     scope = 'https://www.googleapis.com/auth/pubsub'
     max_messages = 1
+    client_cache = client_cache
 
-    def __init__(self, project_id, service_account, subscription_name, topic_name):
+    def __init__(self, project_id, service_account, subscription_name, topic_name,
+                 batch_size=None, batch_timeout=1000,
+                 max_messages=None, max_bytes=None, max_lease_duration=None,
+                 executor_workers=None, scheduler=None, process_pool=None, codec=None, metrics=None,
+                 dedup=None):
         logger.info("Initializing PubSub consumer")
         self.project_id = project_id
         self.service_account = service_account
         self.subscription_name = subscription_name
         self.topic_name = topic_name
-        self.client = self.setup_client()
-        self.subscription_path = self.client.subscription_path(self.project_id, self.subscription_name)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self._batch = []
+        self._batch_lock = Lock()
+        self._batch_timer = None
+        self._subscription = None
+        if max_messages is not None:
+            self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_lease_duration = max_lease_duration
+        self.executor_workers = executor_workers
+        self.scheduler = scheduler
+        self.process_pool = process_pool
+        self._process_executor = None
+        self.codec = get_codec(codec, allow_auto=True)
+        self.metrics = metrics
+        self.dedup = dedup
+        self._client = None
+        self._client_key = None
+        self._client_lock = Lock()
+        self.subscription_path = pubsub.SubscriberClient.subscription_path(self.project_id, self.subscription_name)
+
+    @property
+    def client(self):
+        # credentials and the gRPC channel are only set up for the first request
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.setup_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
 
     def on_message(self, message):
+        if self.dedup is not None and self.dedup.seen(self.dedup_key(message)):
+            logger.info("Acking duplicate message %s", message.message_id)
+            if self.metrics is not None:
+                self.metrics.increment('messages_deduplicated')
+            return message.ack()
+        if self.batch_size:
+            return self.add_to_batch(message)
+        started = monotonic()
         try:
-            self.callback(message.data)
+            self.run_callback(self.message_body(message))
         except Exception as e:
-            logger.exception(f"ERROR! Couldn't process the following message: {message.data} {e}")
+            logger.exception("ERROR! Couldn't process message %s: %r", message.message_id, e)
             message.nack()
+            if self.metrics is not None:
+                self.observe_settled(started, 0, 1)
         else:
-            logger.info(f"Message acknowledged: {message.data}")
+            logger.debug("Message acknowledged: %s", message.message_id)
+            if self.dedup is not None:
+                self.dedup.mark(self.dedup_key(message))
+            message.ack()
+            if self.metrics is not None:
+                self.observe_settled(started, 1, 0)
+
+    def observe_settled(self, started, acked, nacked):
+        self.metrics.observe('callback_seconds', monotonic() - started)
+        if acked:
+            self.metrics.increment('messages_acked', acked)
+        if nacked:
+            # nacked messages are redelivered by Pub/Sub
+            self.metrics.increment('messages_requeued', nacked)
+
+    @staticmethod
+    def dedup_key(message):
+        return message_key(message.data, message.message_id)
+
+    def message_body(self, message):
+        attributes = message.attributes
+        return self.decode_message(message.data, attributes.get('content_type'), attributes.get('content_encoding'))
+
+    def run_callback(self, data):
+        if self._process_executor is None:
+            return self.callback(data)
+        # the scheduler thread waits, so flow control still bounds the messages in flight
+        return self._process_executor.submit(self.callback, data).result()
+
+    def add_to_batch(self, message):
+        with self._batch_lock:
+            self._batch.append(message)
+            if len(self._batch) < self.batch_size:
+                if self._batch_timer is None:
+                    self._batch_timer = Timer(self.batch_timeout / 1000, self.flush_batch)
+                    self._batch_timer.daemon = True
+                    self._batch_timer.start()
+                return
+            batch = self._take_batch()
+        self.process_batch(batch)
+
+    def _take_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._batch = self._batch, []
+        return batch
+
+    def flush_batch(self):
+        with self._batch_lock:
+            batch = self._take_batch()
+        if batch:
+            self.process_batch(batch)
+
+    def process_batch(self, batch):
+        started = monotonic()
+        error = None
+        try:
+            self.run_callback([self.message_body(message) for message in batch])
+        except Exception as e:
+            logger.exception("ERROR! Couldn't process a batch of %d messages: %r", len(batch), e)
+            error = e
+        failed = failed_indexes(error, len(batch))
+        for index, message in enumerate(batch):
+            if index in failed:
+                message.nack()
+                continue
+            if self.dedup is not None:
+                self.dedup.mark(self.dedup_key(message))
             message.ack()
+        logger.debug("Batch of %d messages acknowledged", len(batch) - len(failed))
+        if self.metrics is not None:
+            self.observe_settled(started, len(batch) - len(failed), len(failed))
 
     def _get_credentials(self):
+        return self.client_cache.credentials((self.project_id, freeze(self.service_account), self.scope),
+                                             self._load_credentials)
+
+    def _load_credentials(self):
         if isinstance(self.service_account, Mapping):
             return Credentials.from_service_account_info(self.service_account, scopes=(self.scope,))
         return Credentials.from_service_account_file(self.service_account, scopes=(self.scope,))
 
     def setup_client(self):
+        """Shares the client of consumers with the same project and service account."""
+        self._client_key = ('subscriber', self.project_id, freeze(self.service_account))
+        return self.client_cache.acquire(self._client_key, self.create_client, pubsub.SubscriberClient.close)
+
+    def create_client(self):
         credentials = self._get_credentials()
         return pubsub.SubscriberClient(credentials=credentials)
 
@@ -65,19 +222,130 @@ class PubsubConsumer(QueueConsumer):
         self.callback = callback
         logger.info("Trying to connect to PubSub ...")
         try:
-            self.client.get_subscription(self.subscription_path)
+            self.client.get_subscription(subscription=self.subscription_path)
         except google.api_core.exceptions.NotFound:
             logger.warning('Subscription (%s) DO NOT exits. App will try to create automatically.',
                            self.subscription_path)
             topic_path = self.client.topic_path(self.project_id, self.topic_name)
-            self.client.create_subscription(self.subscription_path, topic_path)
+            self.client.create_subscription(name=self.subscription_path, topic=topic_path)
             # create the subscription, if goes well continue, if not let the Exception throws
             logger.info('Subscription created successfully.')
-        self.client.subscribe(self.subscription_path, self.on_message,
-                              flow_control=FlowControl(max_messages=self.max_messages))
+        self._process_executor = self.setup_process_executor()
+        self._subscription = self.client.subscribe(self.subscription_path, self.on_message,
+                                                   flow_control=self.get_flow_control(),
+                                                   scheduler=self.get_scheduler())
         logger.info("PubSub has connected successfully to the topic.")
         logger.info("Application is listening to the PubSub topic...")
 
+    def get_flow_control(self):
+        settings = dict(max_messages=max(self.max_messages, self.batch_size or 0))
+        if self.max_bytes is not None:
+            settings['max_bytes'] = self.max_bytes
+        if self.max_lease_duration is not None:
+            settings['max_lease_duration'] = self.max_lease_duration
+        return FlowControl(**settings)
+
+    def get_scheduler(self):
+        if self.scheduler is not None or not self.executor_workers:
+            return self.scheduler
+        return ThreadScheduler(executor=ThreadPoolExecutor(max_workers=self.executor_workers))
+
+    def setup_process_executor(self):
+        if self.process_pool is None or isinstance(self.process_pool, Executor):
+            return self.process_pool
+        return ProcessPoolExecutor(max_workers=self.process_pool)
+
+    def wait(self, timeout=None):
+        """Block until the streaming pull of :meth:`start_listening` stops, raising its error."""
+        if self._subscription is not None:
+            self._subscription.result(timeout)
+
+    def stop(self):
+        logger.info('Stopping')
+        if self._subscription is not None:
+            self._subscription.cancel()
+            self._subscription = None
+        self.flush_batch()
+        if self._process_executor is not None and self._process_executor is not self.process_pool:
+            self._process_executor.shutdown()
+        logger.info('Stopped')
+
+    def close(self):
+        """Stop and release the client, closing it if no other consumer uses it."""
+        self.stop()
+        with self._client_lock:
+            if self._client_key is not None:
+                self.client_cache.release(self._client_key)
+            self._client, self._client_key = None, None
+
+    def pull_batch(self, max_messages=100, timeout=None):
+        try:
+            response = self.client.pull(subscription=self.subscription_path, max_messages=max_messages,
+                                        timeout=timeout)
+        except google.api_core.exceptions.DeadlineExceeded:
+            return []
+        return list(response.received_messages)
+
+    def acknowledge(self, received_messages):
+        if received_messages:
+            self.client.acknowledge(subscription=self.subscription_path,
+                                    ack_ids=[received.ack_id for received in received_messages])
+
+    def nack(self, received_messages):
+        if received_messages:
+            self.client.modify_ack_deadline(subscription=self.subscription_path,
+                                            ack_ids=[received.ack_id for received in received_messages],
+                                            ack_deadline_seconds=0)
+
+    def iter_batches(self, max_messages=100, timeout=None):
+        """
+        Pull batches until the subscription is empty, yielding the message bodies.
+
+        A batch is acked when the loop asks for the next one, it is nacked if the loop stops early.
+        """
+        while True:
+            batch = self.pull_batch(max_messages, timeout)
+            if not batch:
+                return
+            try:
+                yield [self.message_body(received.message) for received in batch]
+            except GeneratorExit:
+                self.nack(batch)
+                raise
+            self.acknowledge(batch)
+
+    def drain(self, callback=print, max_messages=100, timeout=None, max_attempts=3):
+        """
+        Pull batches until the subscription is empty, returns how many messages ``callback`` processed.
+
+        Failed messages are nacked and retried up to ``max_attempts`` times, then left to the
+        subscription (and its dead letter policy), so the drain ends once only they are left.
+        """
+        processed = 0
+        failures = {}
+        while True:
+            batch = self.pull_batch(max_messages, timeout)
+            exhausted = [received for received in batch if failures.get(received.message.message_id, 0) >= max_attempts]
+            batch = [received for received in batch if failures.get(received.message.message_id, 0) < max_attempts]
+            self.nack(exhausted)
+            if not batch:
+                if exhausted:
+                    logger.warning("Drained leaving %d messages that failed %d times", len(exhausted), max_attempts)
+                return processed
+            error = None
+            try:
+                callback([self.message_body(received.message) for received in batch])
+            except Exception as e:
+                logger.exception("ERROR! Couldn't process a batch of %d messages: %r", len(batch), e)
+                error = e
+            failed = failed_indexes(error, len(batch))
+            self.acknowledge([received for index, received in enumerate(batch) if index not in failed])
+            self.nack([received for index, received in enumerate(batch) if index in failed])
+            for index in failed:
+                message_id = batch[index].message.message_id
+                failures[message_id] = failures.get(message_id, 0) + 1
+            processed += len(batch) - len(failed)
+
     def is_connected(self):
         from warnings import warn
         warn('Deprecated, use ping instead', DeprecationWarning)
@@ -85,7 +353,7 @@ class PubsubConsumer(QueueConsumer):
 
     def ping(self):
         try:
-            self.client.get_subscription(self.subscription_path)
+            self.client.get_subscription(subscription=self.subscription_path)
             return True
         except GoogleAPICallError:
             return False
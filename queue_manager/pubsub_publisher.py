@@ -5,13 +5,37 @@
     publisher = PubsubPublisher('project_id', 'path/to/sa.json', 'topic_name')
 
     publisher.publish_message('hello')
+
+    # or publishing without waiting, at the client batching throughput
+    publisher = PubsubPublisher('project_id', 'path/to/sa.json', 'topic_name',
+                                batch_settings=dict(max_messages=1000, max_latency=0.05))
+    for number in range(10000):
+        publisher.publish_message_async(str(number), callback=lambda future: print(future.result()))
+    publisher.flush()
+
+    # or serializing python objects, the codec is recorded on the content_type attribute
+    publisher = PubsubPublisher('project_id', 'path/to/sa.json', 'topic_name', codec='msgpack')
+    publisher.publish_message({'hello': 'world'})
+
+    # or publishing to many topics through one client
+    router = PubsubRoutingPublisher('project_id', 'path/to/sa.json')
+    router.publish('orders', 'hello')
+    results = router.publish_batch([('orders', 'one'), ('payments', 'two', dict(origin='api'))])
+    results['payments'].nacked
 """
 import logging
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from collections.abc import Mapping
-from time import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock
+from time import monotonic, time
 
 from . import QueuePublisher
+from .batch import PublishBatchResult
+from .client_cache import client_cache
+from .compression import get_compressor
+from .serialization import get_codec
+from .topology import freeze
 
 try:
     from google.api_core.exceptions import GoogleAPICallError
@@ -27,11 +51,25 @@ class PubsubPublisher(QueuePublisher):
     _last_assertion = defaultdict(int)
     _assertion_ttl = 30
     scope = 'https://www.googleapis.com/auth/pubsub'
+    client_cache = client_cache
 
-    def __init__(self, project_id, service_account, topic_name="ping"):
+    def __init__(self, project_id, service_account, topic_name="ping",
+                 batch_settings=None, publisher_options=None, codec=None,
+                 compression=None, compression_threshold=1024, metrics=None):
         logger.debug('Init PubsubPublisher ...')
         self.project_id = project_id
         self.service_account = service_account
+        self.batch_settings = batch_settings
+        self.publisher_options = publisher_options
+        self.codec = get_codec(codec)
+        self.compression = get_compressor(compression)
+        self.compression_threshold = compression_threshold
+        self.metrics = metrics
+        self._futures = set()
+        self._futures_lock = Lock()
+        self._client = None
+        self._client_key = None
+        self._client_lock = Lock()
 
         full_topic_name = 'projects/{project_id}/topics/{topic}'.format(
             project_id=self.project_id,
@@ -44,7 +82,18 @@ class PubsubPublisher(QueuePublisher):
         self.full_topic_name = full_topic_name
         self.topic_name_ping = topic_name_ping
 
-        self.client = self.setup_client()
+    @property
+    def client(self):
+        # credentials and the gRPC channel are only set up for the first request
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.setup_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
 
     def assert_topic(self, topic_name):
         if time() - self._assertion_ttl < self._last_assertion[topic_name]:
@@ -52,27 +101,61 @@ class PubsubPublisher(QueuePublisher):
         self._last_assertion[topic_name] = time()
         try:
             logger.debug('Getting topic %s', topic_name)
-            self.client.get_topic(topic_name)
+            self.client.get_topic(topic=topic_name)
             logger.debug('Nice, topic already exists %s', topic_name)
         except GoogleAPICallError as error:
             if error.code == 404:
                 logger.info('Topic doesnt exist, creating a new topic %s', topic_name)
-                self.client.create_topic(topic_name)
+                self.client.create_topic(name=topic_name)
             else:
                 self._last_assertion[topic_name] = 0
                 logger.error('An error occurred while getting the topic %s, reason: %s', topic_name, error)
                 raise error
 
     def _get_credentials(self):
+        return self.client_cache.credentials((self.project_id, freeze(self.service_account), self.scope),
+                                             self._load_credentials)
+
+    def _load_credentials(self):
         if isinstance(self.service_account, Mapping):
             return Credentials.from_service_account_info(self.service_account, scopes=(self.scope,))
         return Credentials.from_service_account_file(self.service_account, scopes=(self.scope,))
 
+    def _get_client_options(self):
+        options = {}
+        if self.batch_settings is not None:
+            options['batch_settings'] = pubsub_v1.types.BatchSettings(**self.batch_settings) \
+                if isinstance(self.batch_settings, Mapping) else self.batch_settings
+        if isinstance(self.publisher_options, Mapping):
+            publisher_options = dict(self.publisher_options)
+            if isinstance(publisher_options.get('flow_control'), Mapping):
+                publisher_options['flow_control'] = pubsub_v1.types.PublishFlowControl(
+                    **publisher_options['flow_control'])
+            options['publisher_options'] = pubsub_v1.types.PublisherOptions(**publisher_options)
+        elif self.publisher_options is not None:
+            options['publisher_options'] = self.publisher_options
+        return options
+
+    def client_key(self):
+        return ('publisher', self.project_id, freeze(self.service_account),
+                freeze(self.batch_settings), freeze(self.publisher_options))
+
     def setup_client(self):
+        """Shares the client of publishers with the same project, service account and options."""
+        self._client_key = self.client_key()
+        return self.client_cache.acquire(self._client_key, self.create_client, self.close_client)
+
+    def create_client(self):
         credentials = self._get_credentials()
-        publisher_client = pubsub_v1.PublisherClient(credentials=credentials)
+        publisher_client = pubsub_v1.PublisherClient(credentials=credentials, **self._get_client_options())
         return publisher_client
 
+    @staticmethod
+    def close_client(client):
+        # sends what is still batched, then closes the gRPC channel
+        client.stop()
+        client.transport.close()
+
     def ping(self):
         self.assert_topic(self.topic_name_ping)
         response = self.client.publish(topic=self.topic_name_ping, data=b"OK")
@@ -81,9 +164,122 @@ class PubsubPublisher(QueuePublisher):
         return message_id
 
     def publish_message(self, message, message_properties=None):
-        message_properties = message_properties or {}
-        if type(message) is not bytes:
+        return self.publish_to(self.full_topic_name, message, message_properties)
+
+    def publish_message_async(self, message, message_properties=None, callback=None):
+        return self.publish_to_async(self.full_topic_name, message, message_properties, callback)
+
+    def publish_to(self, topic, message, message_properties=None):
+        """Publish to the ``projects/{project_id}/topics/{topic}`` path and wait for the message id."""
+        if self.metrics is None:
+            return self.publish_to_async(topic, message, message_properties).result(timeout=5000)
+        started = monotonic()
+        try:
+            return self.publish_to_async(topic, message, message_properties).result(timeout=5000)
+        finally:
+            self.metrics.observe('publish_seconds', monotonic() - started)
+
+    def publish_to_async(self, topic, message, message_properties=None, callback=None):
+        message, content_type, content_encoding = self.encode_message(message)
+        message_properties = self.encoded_properties(message_properties, content_type, content_encoding) or {}
+        if isinstance(message, str):
             message = message.encode('utf-8')
-        self.assert_topic(self.full_topic_name)
-        response = self.client.publish(self.full_topic_name, message, **message_properties)
-        return response.result(timeout=5000)
+        elif type(message) is not bytes:
+            # memoryview and bytearray bodies, the client only accepts bytes
+            message = bytes(message)
+        self.assert_topic(topic)
+        future = self.client.publish(topic, message, **message_properties)
+        with self._futures_lock:
+            self._futures.add(future)
+            in_flight = len(self._futures)
+        # discarded first, so the gauge of observe_confirm does not count it
+        future.add_done_callback(self._discard_future)
+        if self.metrics is not None:
+            self.metrics.gauge('messages_in_flight', in_flight)
+            future.add_done_callback(self.observe_confirm(monotonic()))
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def observe_confirm(self, started):
+        def observe(future):
+            self.metrics.observe('confirm_seconds', monotonic() - started)
+            if future.exception() is not None:
+                self.metrics.increment('publish_nacked')
+            self.metrics.gauge('messages_in_flight', len(self._futures))
+        return observe
+
+    def _discard_future(self, future):
+        with self._futures_lock:
+            self._futures.discard(future)
+
+    def flush(self, timeout=None):
+        """Wait for all outstanding publishes, returns the exceptions of the failed (or timed out) ones."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._futures_lock:
+            futures = list(self._futures)
+        errors = []
+        for future in futures:
+            try:
+                future.result(timeout=None if deadline is None else max(deadline - monotonic(), 0))
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def close(self, timeout=None):
+        """Wait for the outstanding publishes and release the client, closing it if no other publisher uses it."""
+        self.flush(timeout)
+        with self._client_lock:
+            if self._client_key is not None:
+                self.client_cache.release(self._client_key)
+            self._client, self._client_key = None, None
+
+
+class PubsubRoutingPublisher(PubsubPublisher):
+    """
+    Publishes to many topics of ``project_id`` through one client, which batches per topic.
+    Each topic is asserted once per ``_assertion_ttl``, like :meth:`PubsubPublisher.assert_topic`.
+    """
+
+    def __init__(self, project_id, service_account, **kwargs):
+        super(PubsubRoutingPublisher, self).__init__(project_id, service_account, 'ping', **kwargs)
+
+    def topic_path(self, destination):
+        return 'projects/{project_id}/topics/{topic}'.format(project_id=self.project_id, topic=destination)
+
+    def publish(self, destination, message, message_properties=None):
+        return self.publish_to(self.topic_path(destination), message, message_properties)
+
+    def publish_async(self, destination, message, message_properties=None, callback=None):
+        return self.publish_to_async(self.topic_path(destination), message, message_properties, callback)
+
+    def publish_batch(self, messages, timeout=None):
+        """
+        Publish ``(destination, message)`` or ``(destination, message, message_properties)``
+        items, returns a :class:`PublishBatchResult` by destination, failed publishes are nacked.
+        Publishes not confirmed within ``timeout`` seconds are ``timed_out`` instead, the
+        client may still publish them.
+        """
+        published = []
+        for destination, *entry in messages:
+            message, message_properties = entry if len(entry) == 2 else (entry[0], None)
+            published.append((destination, entry[0] if len(entry) == 1 else tuple(entry),
+                              self.publish_async(destination, message, message_properties)))
+
+        deadline = None if timeout is None else monotonic() + timeout
+        results = OrderedDict()
+        for destination, entry, future in published:
+            result = results.setdefault(destination, PublishBatchResult([], [], [], []))
+            try:
+                future.result(timeout=None if deadline is None else max(deadline - monotonic(), 0))
+            except FutureTimeoutError:
+                logger.warning('Publish to %s not confirmed within %ss', destination, timeout)
+                result.timed_out.append(entry)
+            except Exception as e:
+                logger.warning('Could not publish to %s: %r', destination, e)
+                result.nacked.append(entry)
+            else:
+                result.confirmed.append(entry)
+        return results
+
+    publish_many = publish_batch
@@ -16,26 +16,57 @@
     qm.pop('hello')
     # Hello from QueueManager
     del(qm)
+
+    # or keeping the connection and a channel per queue open between calls
+    qm = QueueManager(conn_params, keep_alive=True)
+
+    # pop many messages at once
+    qm.pop_many('hello', 100)
+    # or stream the queue until it is drained, acking each 500 messages at once
+    for body in qm.iter_queue('hello', prefetch=500, ack=ACK_BATCH):
+        print(body)
+    # or acking manually, unacked messages are requeued when the loop stops
+    for body, ack in qm.iter_queue('hello', ack=ACK_MANUAL):
+        ack()
 """
 import logging
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
 
 try:
     import pika
 except ModuleNotFoundError:
     raise ModuleNotFoundError("You need to install pika")
 
+from queue_manager.topology import freeze, topology_cache
+
+ACK_IMMEDIATE = 'immediate'
+ACK_MANUAL = 'manual'
+ACK_BATCH = 'batch'
+
 
 class QueueManager:
     connection = None
     connection_parameters = {}
     logger = None
+    topology_cache = topology_cache
+    connection_errors = (pika.exceptions.AMQPConnectionError,
+                         pika.exceptions.ChannelClosed,
+                         pika.exceptions.ChannelWrongStateError)
 
-    def __init__(self, connection_parameters, logger=logging.getLogger(__name__)):
+    def __init__(self, connection_parameters, logger=logging.getLogger(__name__), keep_alive=False):
         self.logger = logger
         self.logger.debug("init Queue Manager")
         self.logger.debug("connection parameters %s:%s", connection_parameters.get('host'),
                           connection_parameters.get('port'))
         self.connection_parameters = connection_parameters
+        self.keep_alive = keep_alive
+        self.channels = {}
+        if 'urls' in connection_parameters:
+            self.connection_key = tuple(connection_parameters['urls'])
+        else:
+            self.connection_key = (connection_parameters.get('host'), connection_parameters.get('port'))
 
     def __connect(self):
         if 'urls' in self.connection_parameters:
@@ -56,55 +87,165 @@ class QueueManager:
         self.connection = pika.BlockingConnection(parameters)
 
     def __get_channel(self, queue_name=None, queue_args=None):
-        if not self.connection:
+        if not self.connection or not self.connection.is_open:
             self.__connect()
-        self.logger.debug("getting channel")
-        channel = self.connection.channel()
+            self.channels = {}
+
+        channel = self.channels.get(queue_name)
+        if channel is None or not channel.is_open:
+            self.logger.debug("getting channel")
+            channel = self.connection.channel()
+            if self.keep_alive:
+                self.channels[queue_name] = channel
 
         if queue_name:
-            if queue_args:
-                self.logger.debug('Declare queue %s',
-                                  channel.queue_declare(queue=queue_name, arguments=queue_args))
-            else:
-                self.logger.debug('Declare queue %s', channel.queue_declare(queue=queue_name))
+            self.topology_cache.assert_declared(self.connection_key, ('queue', queue_name, freeze(queue_args)),
+                                                lambda: self.__declare_queue(channel, queue_name, queue_args))
 
         return channel
 
+    def __declare_queue(self, channel, queue_name, queue_args):
+        if queue_args:
+            self.logger.debug('Declare queue %s', channel.queue_declare(queue=queue_name, arguments=queue_args))
+        else:
+            self.logger.debug('Declare queue %s', channel.queue_declare(queue=queue_name))
+
+    @contextmanager
+    def __invalidate_topology_on_close(self):
+        try:
+            yield
+        except (pika.exceptions.ChannelClosed, pika.exceptions.ChannelWrongStateError):
+            self.topology_cache.invalidate(self.connection_key)
+            raise
+
+    def __run(self, operation, *args):
+        try:
+            try:
+                return operation(*args)
+            except self.connection_errors as e:
+                if not self.keep_alive:
+                    raise
+                self.logger.warning("connection lost, reconnecting: %r", e)
+                self.__disconnect()
+                return operation(*args)
+        finally:
+            if not self.keep_alive:
+                self.__disconnect()
+
     def push(self, queue_name, body, queue_args=None, pika_properties=None):
+        return self.__run(self.__push, queue_name, body, queue_args, pika_properties)
+
+    def __push(self, queue_name, body, queue_args, pika_properties):
         channel = self.__get_channel(queue_name, queue_args)
         self.logger.debug("pushing %s to queue %s", body, queue_name)
-        ret = channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=body,
-            properties=pika_properties
-        )
+        with self.__invalidate_topology_on_close():
+            ret = channel.basic_publish(
+                exchange='',
+                routing_key=queue_name,
+                body=body,
+                properties=pika_properties
+            )
         self.logger.debug("pushed %s to queue %s return(%r)", body, queue_name, ret)
-        self.__disconnect()
         return ret
 
     def pop(self, queue_name, queue_args=None):
+        return self.__run(self.__pop, queue_name, queue_args)
+
+    def __pop(self, queue_name, queue_args):
         channel = self.__get_channel(queue_name, queue_args)
         self.logger.debug("pop from queue %s", queue_name)
 
-        method_frame, header_frame, body = channel.basic_get(queue=queue_name)
+        with self.__invalidate_topology_on_close():
+            method_frame, header_frame, body = channel.basic_get(queue=queue_name)
         self.logger.debug("method_frame.NAME (%s)", method_frame.NAME if method_frame else '')
         if method_frame and method_frame.NAME == 'Basic.GetOk':
             self.logger.debug("[x] Received %r" % body)
             channel.basic_ack(delivery_tag=method_frame.delivery_tag)
 
-        self.__disconnect()
         return body
 
+    def pop_many(self, queue_name, count, queue_args=None):
+        messages = self.iter_queue(queue_name, prefetch=count, queue_args=queue_args)
+        try:
+            return list(islice(messages, count))
+        finally:
+            messages.close()
+
+    def iter_queue(self, queue_name, prefetch=100, ack=ACK_IMMEDIATE, queue_args=None, inactivity_timeout=1):
+        """
+        Consume ``queue_name`` until it stays empty for ``inactivity_timeout`` seconds.
+
+        ``ACK_IMMEDIATE`` acks each message as it is received, like :meth:`pop`.
+        ``ACK_BATCH`` acks every ``prefetch`` messages at once with a multiple ack, and the messages
+        yielded so far when the loop stops early.
+        ``ACK_MANUAL`` yields ``(body, ack)`` pairs, ``ack(multiple=False)`` must be called before the loop stops.
+        The broker delivers no more than ``prefetch`` unacked messages, holding that many raises
+        :class:`RuntimeError` instead of waiting for the inactivity timeout as if the queue were empty.
+        Messages not acked when the loop stops early are requeued. The channel prefetch is restored afterwards.
+        """
+        if ack not in (ACK_IMMEDIATE, ACK_MANUAL, ACK_BATCH):
+            raise ValueError('Invalid ack policy {!r}'.format(ack))
+
+        channel = self.__get_channel(queue_name, queue_args)
+        channel.basic_qos(prefetch_count=prefetch)
+        self.logger.debug("consuming from queue %s", queue_name)
+        unacked = []
+
+        def acknowledge(delivery_tag, multiple=False):
+            channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+            unacked[:] = [tag for tag in unacked if tag > delivery_tag] if multiple else \
+                [tag for tag in unacked if tag != delivery_tag]
+
+        try:
+            with self.__invalidate_topology_on_close():
+                for method_frame, _, body in channel.consume(queue_name, inactivity_timeout=inactivity_timeout):
+                    if method_frame is None:
+                        if ack == ACK_MANUAL and len(unacked) >= prefetch:
+                            raise RuntimeError('{} messages of {} are not acked, no more are delivered until they '
+                                               'are, raise prefetch or ack them'.format(len(unacked), queue_name))
+                        break
+
+                    delivery_tag = method_frame.delivery_tag
+                    if ack == ACK_IMMEDIATE:
+                        channel.basic_ack(delivery_tag=delivery_tag)
+                        yield body
+                        continue
+
+                    unacked.append(delivery_tag)
+                    if ack == ACK_MANUAL:
+                        yield body, partial(acknowledge, delivery_tag)
+                        continue
+
+                    yield body
+                    if len(unacked) >= prefetch:
+                        acknowledge(delivery_tag, multiple=True)
+        finally:
+            if channel.is_open:
+                if ack == ACK_BATCH and unacked:
+                    # every message left was yielded, the caller has it already
+                    acknowledge(unacked[-1], multiple=True)
+                # requeues the messages prefetched but not yielded
+                channel.cancel()
+                for delivery_tag in unacked:
+                    channel.basic_reject(delivery_tag=delivery_tag, requeue=True)
+                # kept alive channels are reused by other calls, back to the default unlimited prefetch
+                channel.basic_qos(prefetch_count=0)
+            if not self.keep_alive:
+                self.__disconnect()
+
     def ping(self):
         if not self.connection:
             self.__connect()
         return self.connection.is_open
 
     def __disconnect(self):
+        self.channels = {}
         if self.connection:
             self.logger.debug("disconnecting")
-            self.logger.debug(self.connection.close())
+            try:
+                self.logger.debug(self.connection.close())
+            except pika.exceptions.AMQPError as e:
+                self.logger.debug("connection was already closed %r", e)
             self.connection = None
 
     def __del__(self):
@@ -19,15 +19,39 @@ Inspired on `Asynchronous Cnsumer Example
         consumer.start_listening(callback)
     except KeyboardInterrupt:
         consumer.stop()
+
+    # or processing up to 10 messages at once on a thread pool ('process' is also accepted)
+    consumer = RabbitMqConsumer(single_url, queue='queue_name', prefetch_count=10, worker_pool='thread')
+
+    # or receiving up to 100 messages at once, waiting at most 500 milliseconds for them
+    consumer = RabbitMqConsumer(single_url, queue='queue_name', batch_size=100, batch_timeout=500)
+
+    def batch_callback(messages):
+        print("message bodies", messages)
+
+    # or decoding bodies by their content type, see queue_manager.serialization
+    consumer = RabbitMqConsumer(single_url, queue='queue_name', codec='auto')
+
+    # or reconnecting at once, then with backoff, moving to the next url, see queue_manager.reconnect
+    consumer = RabbitMqConsumer(multiple_urls, queue='queue_name', reconnect_strategy=ReconnectStrategy())
+
+    # or acking redelivered messages already processed without calling back, see queue_manager.dedup
+    consumer = RabbitMqConsumer(single_url, queue='queue_name', dedup=MemoryDedupStore(ttl=3600))
 """
 import logging
 import sys
-from inspect import signature
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from time import monotonic
 
 from queue_manager import QueueConsumer
+from queue_manager.batch import failed_indexes
+from queue_manager.dedup import message_key
+from queue_manager.serialization import get_codec
 
 try:
     import pika
+    from pika.adapters.select_connection import IOLoop
 except ModuleNotFoundError:
     raise ModuleNotFoundError("You need to install pika")
 
@@ -41,13 +65,23 @@ class RabbitMqConsumer(QueueConsumer):
                  exchange=None, exchange_type=None,
                  queue=None, queue_properties=None,
                  routing_key=None,
-                 declare=True):
+                 declare=True,
+                 prefetch_count=1, worker_pool=None,
+                 batch_size=None, batch_timeout=1000, codec=None, metrics=None,
+                 reconnect_strategy=None, dedup=None):
 
         self._connection = None
+        self._ioloop = None
         self._channel = None
         self._closing = False
         self._consumer_tag = None
-        self._urls = (amqp_urls,) if isinstance(amqp_urls, str) else amqp_urls
+        self._executor = None
+        self._in_flight = 0
+        self._batch = []
+        self._batch_timeout_id = None
+        self._unsettled = set()
+        self._dedup_keys = {}
+        self._urls = (amqp_urls,) if isinstance(amqp_urls, str) else tuple(amqp_urls)
         self.urls = tuple(map(pika.URLParameters, self._urls))
         self.exchange = exchange
         self.exchange_type = exchange_type
@@ -55,16 +89,41 @@ class RabbitMqConsumer(QueueConsumer):
         self.queue_properties = queue_properties
         self.routing_key = routing_key
         self.declare = declare
+        self.prefetch_count = prefetch_count
+        self.worker_pool = worker_pool
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.codec = get_codec(codec, allow_auto=True)
+        self.metrics = metrics
+        self.reconnect_strategy = reconnect_strategy
+        self.dedup = dedup
+
+    @property
+    def ioloop(self):
+        if self._ioloop is None:
+            self._ioloop = IOLoop()
+        return self._ioloop
+
+    def connection_urls(self):
+        if self.reconnect_strategy is None:
+            return self.urls
+        return self.reconnect_strategy.order(self.urls)
 
     def connect(self):
         logger.info('Connecting to %s', self._urls)
 
-        return pika.SelectConnection.create_connection(self.urls, self.on_connection_open)
+        return pika.SelectConnection.create_connection(self.connection_urls(), self.on_connection_open,
+                                                       custom_ioloop=self.ioloop)
 
     def on_connection_open(self, connection):
         if isinstance(connection, Exception):
-            logger.error(connection)
-            sys.exit(1)
+            delay = self.reconnect_strategy and self.reconnect_strategy.next_delay(connection)
+            if delay is None or self._closing:
+                logger.error(connection)
+                sys.exit(1)
+            logger.warning('Could not connect, retrying in %.3f seconds: %r', delay, connection)
+            self.ioloop.call_later(delay, self.reconnect)
+            return
         logger.info('Connection opened')
         self._connection = connection
         self.add_on_connection_close_callback()
@@ -79,19 +138,23 @@ class RabbitMqConsumer(QueueConsumer):
         if self._closing:
             self._connection.ioloop.stop()
         else:
-            logger.warning('Connection closed, reopening in 5 seconds: (%r) %r', connection, error)
-            self._connection.ioloop.call_later(5, self.reconnect)
+            delay = 5 if self.reconnect_strategy is None else self.reconnect_strategy.next_delay(error)
+            if delay is None:
+                logger.error('Connection closed, giving up after %d attempts: %r', self.reconnect_strategy.attempts,
+                             error)
+                self._closing = True
+                return self.ioloop.stop()
+            logger.warning('Connection closed, reopening in %.3f seconds: (%r) %r', delay, connection, error)
+            if self.metrics is not None:
+                self.metrics.increment('reconnects')
+            self.ioloop.call_later(delay, self.reconnect)
 
     def reconnect(self):
-        # This is the old connection IOLoop instance, stop its ioloop
-        self._connection.ioloop.stop()
-
-        if not self._closing:
-            # Create a new connection
-            workflow = self.connect()
+        if self._closing:
+            return
 
-            # There is now a new connection, needs a new ioloop to run
-            workflow._nbio.run()
+        # the ioloop keeps running, just create a new connection on it
+        self.connect()
 
     def open_channel(self):
         logger.info('Creating a new channel')
@@ -100,6 +163,10 @@ class RabbitMqConsumer(QueueConsumer):
     def on_channel_open(self, channel):
         logger.info('Channel opened')
         self._channel = channel
+        self._batch = []
+        self._unsettled = set()
+        # delivery tags restart on a new channel
+        self._dedup_keys = {}
         self.add_on_channel_close_callback()
         if not self.declare:
             return self.on_bindok()
@@ -111,8 +178,11 @@ class RabbitMqConsumer(QueueConsumer):
 
     def on_channel_closed(self, channel, closing_reason):
         logger.error('Channel %s was closed: (%s)', channel, closing_reason)
-        if not self._closing and self._connection.is_open:
-            return self._connection.close()
+        if not self._closing:
+            # on_connection_closed reconnects, closing the connection first if only the channel was lost
+            if self._connection.is_open:
+                self._connection.close()
+            return
         self._connection.ioloop.stop()
 
     def setup_exchange(self):
@@ -159,8 +229,17 @@ class RabbitMqConsumer(QueueConsumer):
     def start_consuming(self):
         logger.info('Issuing consumer related RPC commands')
         self.add_on_cancel_callback()
-        self._channel.basic_qos(prefetch_count=1)
+        self._channel.basic_qos(prefetch_count=max(self.prefetch_count, self.batch_size or 0))
         self._consumer_tag = self._channel.basic_consume(on_message_callback=self.on_message, queue=self.queue)
+        self.observe_reconnected()
+
+    def observe_reconnected(self):
+        """Tell the reconnect strategy the consumer is up again, observing the downtime of a reconnection."""
+        if self.reconnect_strategy is None:
+            return
+        downtime = self.reconnect_strategy.connected()
+        if downtime is not None and self.metrics is not None:
+            self.metrics.observe('reconnect_seconds', downtime)
 
     def add_on_cancel_callback(self):
         logger.info('Adding consumer cancellation callback')
@@ -171,9 +250,28 @@ class RabbitMqConsumer(QueueConsumer):
         if self._channel:
             self._channel.close()
 
-    def on_message(self, unused_channel, basic_deliver, properties, message):
+    def on_message(self, channel, basic_deliver, properties, message):
+        if self.dedup is not None and self.is_duplicate(basic_deliver.delivery_tag, properties, message):
+            logger.info('Acking duplicate message %s', basic_deliver.delivery_tag)
+            if self.metrics is not None:
+                self.metrics.increment('messages_deduplicated')
+            return self.acknowledge_message(basic_deliver.delivery_tag)
+        if properties is not None and (self.codec is not None or properties.content_encoding):
+            try:
+                message = self.decode_message(message, properties.content_type, properties.content_encoding)
+            except Exception as e:
+                # redelivering would fail the same way
+                logger.error('Could not decode message %s: %r', basic_deliver.delivery_tag, e)
+                return self.reject_message(basic_deliver.delivery_tag, False)
+        if self.batch_size:
+            return self.add_to_batch(channel, basic_deliver, properties, message)
+        if self._executor is not None:
+            return self.submit_message(channel, basic_deliver, properties, message)
         try:
-            self.callback(message, properties)
+            if self.metrics is None:
+                self.callback(message, properties)
+            else:
+                self.timed_callback(message, properties)
             self.acknowledge_message(basic_deliver.delivery_tag)
         except KeyboardInterrupt as e:
             self.reject_message(basic_deliver.delivery_tag)
@@ -182,32 +280,185 @@ class RabbitMqConsumer(QueueConsumer):
             logger.exception(e)
             self.reject_message(basic_deliver.delivery_tag, not basic_deliver.redelivered)
 
+    def is_duplicate(self, delivery_tag, properties, message):
+        """Whether the message was processed already, otherwise keeps its key to mark it once acked."""
+        key = message_key(message, properties.message_id if properties is not None else None)
+        if self.dedup.seen(key):
+            return True
+        self._dedup_keys[delivery_tag] = key
+        return False
+
+    def mark_processed(self, delivery_tag, multiple):
+        tags = [tag for tag in self._dedup_keys if tag <= delivery_tag] if multiple else [delivery_tag]
+        for tag in tags:
+            key = self._dedup_keys.pop(tag, None)
+            if key is not None:
+                self.dedup.mark(key)
+
+    def timed_callback(self, message, properties):
+        started = monotonic()
+        try:
+            return self.callback(message, properties)
+        finally:
+            self.metrics.observe('callback_seconds', monotonic() - started)
+
+    def track_in_flight(self, count):
+        self._in_flight += count
+        if self.metrics is not None:
+            self.metrics.gauge('messages_in_flight', self._in_flight)
+
+    def observe_since(self, started):
+        def observe(future):
+            self.metrics.observe('callback_seconds', monotonic() - started)
+        return observe
+
+    def submit_message(self, channel, basic_deliver, properties, message):
+        self.track_in_flight(1)
+        future = self._executor.submit(self.callback, message, properties)
+        if self.metrics is not None:
+            future.add_done_callback(self.observe_since(monotonic()))
+        future.add_done_callback(
+            lambda future: self.add_callback_threadsafe(partial(self.settle_message, channel, basic_deliver, future))
+        )
+
+    def settle_message(self, channel, basic_deliver, future):
+        self.track_in_flight(-1)
+        error = future.exception()
+        if channel is not self._channel or not channel.is_open:
+            logger.warning('Channel closed before settling message %s, it will be redelivered',
+                           basic_deliver.delivery_tag)
+        elif error is None:
+            self.acknowledge_message(basic_deliver.delivery_tag)
+        else:
+            logger.error(error, exc_info=error)
+            self.reject_message(basic_deliver.delivery_tag, not basic_deliver.redelivered)
+
+        if self._closing and not self._in_flight and self._consumer_tag is None:
+            self.close_channel()
+
+    def add_to_batch(self, channel, basic_deliver, properties, message):
+        self._batch.append((channel, basic_deliver, properties, message))
+        self._unsettled.add(basic_deliver.delivery_tag)
+        if len(self._batch) >= self.batch_size:
+            return self.flush_batch()
+        if self._batch_timeout_id is None:
+            self._batch_timeout_id = self.ioloop.call_later(self.batch_timeout / 1000, self.flush_batch)
+
+    def flush_batch(self):
+        if self._batch_timeout_id is not None:
+            self.remove_timeout(self._batch_timeout_id)
+            self._batch_timeout_id = None
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        messages = [message for _, _, _, message in batch]
+        properties = [message_properties for _, _, message_properties, _ in batch]
+        self.track_in_flight(len(batch))
+        if self._executor is not None:
+            future = self._executor.submit(self.callback, messages, properties)
+            if self.metrics is not None:
+                future.add_done_callback(self.observe_since(monotonic()))
+            future.add_done_callback(
+                lambda future: self.add_callback_threadsafe(partial(self.settle_batch, batch, future))
+            )
+            return
+
+        future = Future()
+        try:
+            if self.metrics is None:
+                future.set_result(self.callback(messages, properties))
+            else:
+                future.set_result(self.timed_callback(messages, properties))
+        except KeyboardInterrupt as e:
+            self.track_in_flight(-len(batch))
+            for _, basic_deliver, _, _ in batch:
+                self.reject_message(basic_deliver.delivery_tag)
+            raise e
+        except Exception as e:
+            future.set_exception(e)
+        self.settle_batch(batch, future)
+
+    def settle_batch(self, batch, future):
+        self.track_in_flight(-len(batch))
+        channel = batch[0][0]
+        tags = [basic_deliver.delivery_tag for _, basic_deliver, _, _ in batch]
+        error = future.exception()
+        if channel is not self._channel or not channel.is_open:
+            # the tags restart on a new channel, those of this batch may be unsettled ones of the new channel
+            logger.warning('Channel closed before settling a batch of %d messages, they will be redelivered',
+                           len(batch))
+        else:
+            self._unsettled.difference_update(tags)
+            self.settle_batch_messages(batch, tags, error)
+
+        if self._closing and not self._in_flight and self._consumer_tag is None:
+            self.close_channel()
+
+    def settle_batch_messages(self, batch, tags, error):
+        if error is None and (not self._unsettled or min(self._unsettled) > max(tags)):
+            # nothing else is pending below this batch, so a single multiple ack settles it
+            self.acknowledge_message(max(tags), multiple=True)
+            if self.metrics is not None:
+                self.metrics.increment('messages_acked', len(tags))
+            return
+        if error is not None:
+            logger.error(error, exc_info=error)
+        failed = failed_indexes(error, len(batch))
+        for index, (_, basic_deliver, _, _) in enumerate(batch):
+            if index in failed:
+                self.reject_message(basic_deliver.delivery_tag, not basic_deliver.redelivered)
+            else:
+                self.acknowledge_message(basic_deliver.delivery_tag)
+
+    def add_callback_threadsafe(self, callback):
+        self._connection.ioloop.add_callback_threadsafe(callback)
+
+    def remove_timeout(self, handle):
+        self.ioloop.remove_timeout(handle)
+
+    def setup_executor(self):
+        if self.worker_pool is None or isinstance(self.worker_pool, Executor):
+            return self.worker_pool
+        if self.worker_pool == 'thread':
+            return ThreadPoolExecutor(max_workers=self.prefetch_count)
+        if self.worker_pool == 'process':
+            return ProcessPoolExecutor(max_workers=self.prefetch_count)
+        raise ValueError('Invalid worker pool {!r}, use "thread", "process" or an Executor'.format(self.worker_pool))
+
     def reject_message(self, delivery_tag, requeue=True):
+        self._dedup_keys.pop(delivery_tag, None)
         self._channel.basic_reject(delivery_tag, requeue)
-
-    def acknowledge_message(self, delivery_tag):
-        self._channel.basic_ack(delivery_tag)
+        if self.metrics is not None:
+            self.metrics.increment('messages_requeued' if requeue else 'messages_rejected')
+
+    def acknowledge_message(self, delivery_tag, multiple=False):
+        # marked before the ack, a crash in between redelivers a message skipped as duplicate
+        if self._dedup_keys:
+            self.mark_processed(delivery_tag, multiple)
+        self._channel.basic_ack(delivery_tag, multiple)
+        if self.metrics is not None and not multiple:
+            # multiple acks are counted by who knows how many messages they settle
+            self.metrics.increment('messages_acked')
 
     def stop_consuming(self):
         if self._channel:
             logger.info('Sending a Basic.Cancel RPC command to RabbitMQ')
-            self._channel.basic_cancel(self.on_cancelok, self._consumer_tag)
+            self._channel.basic_cancel(self._consumer_tag, self.on_cancelok)
 
     def on_cancelok(self, unused_frame):
         logger.info('RabbitMQ acknowledged the cancellation of the consumer')
+        self._consumer_tag = None
+        self.flush_batch()
+        if self._in_flight:
+            logger.info('Waiting for %d in flight messages before closing the channel', self._in_flight)
+            return
         self.close_channel()
 
     def close_channel(self):
         logger.info('Closing the channel')
         self._channel.close()
 
-    @staticmethod
-    def validate_callback(callback):
-        if 'properties' not in signature(callback).parameters:
-            logger.warning('properties parameter missing on callback signature')
-            return lambda message, properties: callback(message)
-        return callback
-
     def run(self, callback=print):
         from warnings import warn
         warn('Deprecated, use start_listening instead', DeprecationWarning)
@@ -215,15 +466,18 @@ class RabbitMqConsumer(QueueConsumer):
 
     def start_listening(self, callback=print):
         self.callback = self.validate_callback(self.callback or callback)
+        self._executor = self.setup_executor()
 
-        workflow = self.connect()
-        workflow._nbio.run()
+        self.connect()
+        self.ioloop.start()
 
     def stop(self):
         logger.info('Stopping')
         self._closing = True
         self.stop_consuming()
         self._connection.ioloop.start()
+        if self._executor is not None and self._executor is not self.worker_pool:
+            self._executor.shutdown(wait=False)
         logger.info('Stopped')
 
     def close_connection(self):
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Reconnect strategy of the consumers: an immediate first retry, then jittered
+exponential backoff, rotating (``round_robin``) or shuffling (``random``) the broker
+urls so each attempt starts on another node.
+
+The delay of the nth consecutive attempt is ``first_delay`` for the first one, then
+``min(max_delay, base_delay * multiplier ** (n - 2))`` reduced by up to ``jitter``
+(a fraction of it) at random, so consumers of a restarted broker do not reconnect in
+lockstep. Attempts reset once the consumer is consuming again.
+
+.. code:: python
+
+    from queue_manager.reconnect import ReconnectStrategy
+
+    strategy = ReconnectStrategy(base_delay=0.1, max_delay=10, failover='round_robin',
+                                 on_disconnect=lambda error, delay: print('retrying in', delay),
+                                 on_reconnect=lambda downtime: print('down for', downtime))
+    consumer = RabbitMqConsumer(('amqp://hostnameone:port', 'amqp://hostnametwo:port'), queue='queue_name',
+                                reconnect_strategy=strategy)
+    consumer.start_listening(callback)
+
+    strategy.stats()  # {'disconnects': 1, 'reconnects': 1, 'attempts': 0, 'last_downtime': 0.004, ...}
+"""
+import logging
+import random
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+FAILOVERS = ('round_robin', 'random')
+
+
+class ReconnectStrategy:
+
+    def __init__(self, first_delay=0, base_delay=0.1, max_delay=30, multiplier=2, jitter=0.5,
+                 failover='round_robin', max_attempts=None, on_disconnect=None, on_reconnect=None):
+        if failover not in FAILOVERS:
+            raise ValueError('Invalid failover {!r}, use "round_robin" or "random"'.format(failover))
+        self.first_delay = first_delay
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.failover = failover
+        self.max_attempts = max_attempts
+        self.on_disconnect = on_disconnect
+        self.on_reconnect = on_reconnect
+        self.random = random.Random()
+        self.attempts = 0
+        self.disconnects = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.last_downtime = None
+        self.total_downtime = 0.0
+        self._offset = 0
+        self._disconnected_at = None
+
+    def order(self, urls):
+        """The ``urls`` in the order the next attempt should try them."""
+        urls = tuple(urls)
+        if self.failover == 'random':
+            return tuple(self.random.sample(urls, len(urls)))
+        offset = self._offset % len(urls) if urls else 0
+        return urls[offset:] + urls[:offset]
+
+    def delay(self, attempt):
+        if attempt <= 1:
+            delay = self.first_delay
+        else:
+            delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 2))
+        return delay * (1 - self.jitter * self.random.random())
+
+    def next_delay(self, error):
+        """Record a lost connection or failed attempt, returns seconds to wait or ``None`` to give up."""
+        if self._disconnected_at is None:
+            self._disconnected_at = monotonic()
+            self.disconnects += 1
+        self.attempts += 1
+        self.last_error = error
+        self._offset += 1
+        if self.max_attempts is not None and self.attempts > self.max_attempts:
+            return None
+        delay = self.delay(self.attempts)
+        if self.on_disconnect is not None:
+            self.on_disconnect(error, delay)
+        return delay
+
+    def connected(self):
+        """Record a successful (re)connection, returns the downtime when it was a reconnection."""
+        self.attempts = 0
+        if self._disconnected_at is None:
+            return None
+        downtime = monotonic() - self._disconnected_at
+        self._disconnected_at = None
+        self.reconnects += 1
+        self.last_downtime = downtime
+        self.total_downtime += downtime
+        if self.on_reconnect is not None:
+            self.on_reconnect(downtime)
+        return downtime
+
+    def stats(self):
+        return dict(disconnects=self.disconnects, reconnects=self.reconnects, attempts=self.attempts,
+                    last_error=self.last_error, last_downtime=self.last_downtime,
+                    total_downtime=self.total_downtime)
@@ -0,0 +1,43 @@
+import asyncio
+from unittest import TestCase, skipIf
+from unittest.mock import Mock
+
+try:
+    from .asyncio_consumer import AsyncioConsumer
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestAsyncioConsumer(TestCase):
+
+    def test_should_initialize(self):
+        self.assertIsInstance(AsyncioConsumer(''), AsyncioConsumer)
+
+    def test_should_settle_coroutine_callbacks(self):
+        loop = asyncio.new_event_loop()
+        consumer = AsyncioConsumer('', queue='queue_name', max_in_flight=2, loop=loop)
+
+        async def callback(message):
+            await asyncio.sleep(0)
+            if message != b'ok':
+                raise ValueError(message)
+
+        consumer._coroutine_callback = True
+        consumer.callback = consumer.validate_callback(callback)
+        consumer._executor = consumer.setup_executor()
+        channel = consumer._channel = Mock()
+
+        async def consume():
+            consumer.on_message(channel, Mock(delivery_tag=1), None, b'ok')
+            consumer.on_message(channel, Mock(delivery_tag=2, redelivered=True), None, b'fail')
+            while consumer._in_flight:
+                await asyncio.sleep(0)
+
+        loop.run_until_complete(consume())
+        loop.close()
+
+        channel.basic_ack.assert_called_once_with(1, False)
+        channel.basic_reject.assert_called_once_with(2, False)
@@ -0,0 +1,67 @@
+import asyncio
+from unittest import TestCase, skipIf
+from unittest.mock import Mock, patch
+
+try:
+    from .asyncio_publisher import AsyncioPublisher, FutureConfirmTracker
+    from .rabbitmq_publisher import RabbitMqPublisher
+    from pika.exceptions import NackError
+    from pika.spec import Basic
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestAsyncioPublisher(TestCase):
+
+    def test_should_initialize(self):
+        self.assertIsInstance(AsyncioPublisher(''), AsyncioPublisher)
+
+    def test_should_reject_pool_options(self):
+        with self.assertRaises(TypeError):
+            AsyncioPublisher('', queue='queue_name', pool_size=4)
+
+    def test_should_not_be_a_blocking_publisher(self):
+        self.assertNotIsInstance(AsyncioPublisher(''), RabbitMqPublisher)
+        self.assertFalse(hasattr(AsyncioPublisher(''), 'message_count'))
+
+    @patch("queue_manager.asyncio_publisher.AsyncioConnection")
+    def test_should_publish_once_connected_and_confirmed(self, connection_class):
+        connection, channel = Mock(), Mock()
+        connection_class.create_connection.side_effect = \
+            lambda parameters, on_done, custom_ioloop: custom_ioloop.call_soon(on_done, connection)
+        connection.channel.side_effect = lambda on_open_callback: on_open_callback(channel)
+        channel.confirm_delivery.side_effect = lambda on_confirm, callback: callback(None)
+        channel.queue_declare.side_effect = lambda callback, **kwargs: callback(None)
+        publisher = AsyncioPublisher('amqp://asyncio-publisher-test', queue='queue_name', codec='json')
+        channel.basic_publish.side_effect = lambda **params: asyncio.get_running_loop().call_soon(
+            publisher._confirms.on_confirm, Mock(method=Basic.Ack(delivery_tag=1, multiple=False))
+        )
+
+        async def publish():
+            return await publisher.publish_message({'hello': 'world'}, dict(priority=8))
+
+        self.assertIsNone(asyncio.run(publish()))
+        self.assertEqual(channel.queue_declare.call_args[1]['queue'], 'queue_name')
+        params = channel.basic_publish.call_args[1]
+        self.assertEqual(params['routing_key'], 'queue_name')
+        self.assertEqual(params['body'], b'{"hello":"world"}')
+        self.assertEqual(params['properties'].content_type, 'application/json')
+        self.assertEqual(params['properties'].priority, 8)
+
+    def test_should_resolve_publish_futures_on_confirm(self):
+        loop = asyncio.new_event_loop()
+        tracker = FutureConfirmTracker()
+        futures = [loop.create_future() for _ in range(3)]
+        for future in futures:
+            tracker.track(future, '', 'queue_name', b'message')
+
+        tracker.on_confirm(Mock(method=Basic.Ack(delivery_tag=2, multiple=True)))
+        tracker.on_confirm(Mock(method=Basic.Nack(delivery_tag=3)))
+
+        self.assertIsNone(futures[0].result())
+        self.assertIsNone(futures[1].result())
+        self.assertIsInstance(futures[2].exception(), NackError)
+        loop.close()
@@ -0,0 +1,121 @@
+from queue import Full
+from threading import Event, Thread, current_thread
+from unittest import TestCase
+from unittest.mock import Mock
+
+from .background_publisher import BackgroundPublisher, PublishFailed
+from .batch import PublishBatchResult
+from .memory_broker import MemoryBroker, MemoryPublisher
+
+
+class GatedPublisher(MemoryPublisher):
+    """Publishes once ``gate`` is set, nacking the messages in ``nack``."""
+
+    def __init__(self, *args, **kwargs):
+        super(GatedPublisher, self).__init__(*args, **kwargs)
+        self.gate = Event()
+        self.sending = Event()
+        self.nack = ()
+        self.batches = []
+
+    def publish_batch(self, messages, max_outstanding=None):
+        self.sending.set()
+        self.gate.wait()
+        self.batches.append(len(messages))
+        nacked = [entry for entry in messages if entry[0] in self.nack]
+        result = super(GatedPublisher, self).publish_batch([entry for entry in messages if entry not in nacked])
+        return PublishBatchResult(result.confirmed, nacked, result.returned)
+
+
+class SinglePublisher:
+    """A publisher without ``publish_batch``, failing the messages in ``fail``."""
+    metrics = None
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.published = []
+
+    def publish_message(self, message, message_properties=None):
+        if message in self.fail:
+            raise ValueError(message)
+        self.published.append(message)
+        return True
+
+
+class TestBackgroundPublisher(TestCase):
+
+    def test_should_batch_and_resolve_futures(self):
+        broker = MemoryBroker()
+        gated = GatedPublisher('queue_name', broker=broker)
+        gated.nack = ('two',)
+        publisher = BackgroundPublisher(gated, batch_size=10, linger=0.01)
+        futures = [publisher.publish_message(message) for message in ('one', 'two', 'three')]
+        gated.gate.set()
+        publisher.close()
+
+        self.assertTrue(futures[0].result(timeout=1))
+        self.assertEqual(futures[1].exception(timeout=1).reason, 'nacked')
+        self.assertIsInstance(futures[1].exception(), PublishFailed)
+        self.assertTrue(futures[2].result(timeout=1))
+        self.assertEqual(broker.message_count('queue_name'), 2)
+        self.assertLessEqual(len(gated.batches), 2)
+
+    def test_should_apply_overflow_policies(self):
+        gated = GatedPublisher('queue_name', broker=MemoryBroker())
+        publisher = BackgroundPublisher(gated, buffer_size=2, batch_size=1, linger=0, overflow='drop_oldest')
+        first = publisher.publish_message('sending')
+        gated.sending.wait(1)
+        futures = [publisher.publish_message(str(number)) for number in range(3)]
+        self.assertIsInstance(futures[0].exception(timeout=1), Full)
+
+        publisher.overflow = 'drop_new'
+        self.assertIsInstance(publisher.publish_message('new').exception(timeout=1), Full)
+        publisher.overflow = 'raise'
+        self.assertRaises(Full, publisher.publish_message, 'new')
+        publisher.overflow, publisher.timeout = 'block', 0.01
+        self.assertRaises(Full, publisher.publish_message, 'new')
+
+        gated.gate.set()
+        self.assertTrue(publisher.flush(timeout=1))
+        self.assertTrue(first.result() and futures[1].result() and futures[2].result())
+        publisher.close()
+
+    def test_should_publish_one_by_one_without_publish_batch(self):
+        single = SinglePublisher(fail=('two',))
+        publisher = BackgroundPublisher(single, batch_size=10, linger=0.01)
+        futures = [publisher.publish_message(message) for message in ('one', 'two', 'three')]
+        publisher.close()
+
+        self.assertTrue(futures[0].result(timeout=1))
+        self.assertIsInstance(futures[1].exception(timeout=1), ValueError)
+        self.assertTrue(futures[2].result(timeout=1))
+        self.assertEqual(single.published, ['one', 'three'])
+
+    def test_should_fail_a_message_blocked_until_closed(self):
+        gated = GatedPublisher('queue_name', broker=MemoryBroker())
+        publisher = BackgroundPublisher(gated, buffer_size=1, batch_size=1, linger=0)
+        publisher.publish_message('sending')
+        gated.sending.wait(1)
+        publisher.publish_message('buffered')
+        blocked = []
+        thread = Thread(target=lambda: blocked.append(publisher.publish_message('blocked')))
+        thread.start()
+        # blocked once it waits on the condition for room
+        while thread.is_alive() and not publisher._condition._waiters:
+            thread.join(0.01)
+        publisher.close(timeout=0.01)
+        thread.join(1)
+        gated.gate.set()
+        publisher.close()
+
+        self.assertIsInstance(blocked[0].exception(timeout=1), RuntimeError)
+
+    def test_should_ping_from_the_sender_thread(self):
+        single = SinglePublisher()
+        single.ping = Mock(side_effect=lambda: current_thread().name == 'background-publisher')
+        publisher = BackgroundPublisher(single)
+
+        self.assertTrue(publisher.ping(timeout=1))
+        publisher.close()
+        self.assertFalse(publisher.ping())
+        single.ping.assert_called_once_with()
@@ -0,0 +1,30 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from .client_cache import ClientCache
+
+
+class TestClientCache(TestCase):
+
+    def test_should_close_client_with_last_reference(self):
+        cache = ClientCache()
+        create, close = Mock(), Mock()
+
+        client = cache.acquire('key', create, close)
+        self.assertIs(cache.acquire('key', create, close), client)
+        create.assert_called_once()
+        self.assertEqual(cache.references('key'), 2)
+
+        cache.release('key')
+        close.assert_not_called()
+        cache.release('key')
+        close.assert_called_once_with(client)
+        self.assertEqual(cache.references('key'), 0)
+        self.assertIsNot(cache.acquire('key', Mock(), close), client)
+
+    def test_should_load_credentials_once(self):
+        cache = ClientCache()
+        load = Mock()
+
+        self.assertIs(cache.credentials('key', load), cache.credentials('key', load))
+        load.assert_called_once()
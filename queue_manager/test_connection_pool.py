@@ -0,0 +1,42 @@
+from unittest import TestCase, skipIf
+from unittest.mock import patch, Mock
+
+try:
+    from .connection_pool import ConnectionPool, PoolTimeout
+    from pika.exceptions import StreamLostError
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestConnectionPool(TestCase):
+
+    @patch("queue_manager.connection_pool.pika.BlockingConnection")
+    def test_should_reuse_connection_and_channel(self, connection_class):
+        pool = ConnectionPool(('amqp://',), size=1)
+        setup = Mock()
+
+        for _ in range(3):
+            with pool.acquire() as pooled:
+                pooled.channel('publish', setup)
+
+        connection_class.assert_called_once()
+        setup.assert_called_once()
+
+    @patch("queue_manager.connection_pool.pika.BlockingConnection")
+    def test_should_reconnect_when_connection_breaks(self, connection_class):
+        pool = ConnectionPool(('amqp://',), size=1)
+        func = Mock(side_effect=[StreamLostError('lost'), 'ok'])
+
+        self.assertEqual(pool.run(func), 'ok')
+        self.assertEqual(connection_class.call_count, 2)
+
+    def test_should_timeout_when_exhausted(self):
+        pool = ConnectionPool(('amqp://',), size=1, timeout=0)
+        pool._idle.get()
+
+        with self.assertRaises(PoolTimeout):
+            with pool.acquire():
+                pass
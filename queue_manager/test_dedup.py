@@ -0,0 +1,73 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+from unittest.mock import Mock, patch
+
+from .dedup import MemoryDedupStore, SqliteDedupStore, message_key
+
+try:
+    from .rabbitmq_consumer import RabbitMqConsumer
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+
+class TestDedupStores(TestCase):
+
+    def test_should_key_on_message_id_or_body(self):
+        self.assertEqual(message_key(b'body', 'id-1'), 'id:id-1')
+        self.assertEqual(message_key('body'), message_key(b'body'))
+        self.assertNotEqual(message_key(b'body'), message_key(b'other'))
+
+    def test_memory_store_should_evict_least_recently_seen(self):
+        store = MemoryDedupStore(max_size=2)
+        store.mark('one')
+        store.mark('two')
+        self.assertTrue(store.seen('one'))
+        store.mark('three')
+
+        self.assertFalse(store.seen('two'))
+        self.assertTrue(store.seen('one'))
+        self.assertEqual(store.stats(), dict(hits=2, misses=1, size=2))
+
+    def test_memory_store_should_expire_keys(self):
+        store = MemoryDedupStore(ttl=60)
+        with patch("queue_manager.dedup.time", Mock(side_effect=[100, 130, 200])):
+            store.mark('key')
+            self.assertTrue(store.seen('key'))
+            self.assertFalse(store.seen('key'))
+        self.assertEqual(len(store), 0)
+
+    def test_sqlite_store_should_be_shared(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dedup.sqlite')
+            first, second = SqliteDedupStore(path, purge_every=1), SqliteDedupStore(path)
+            first.mark('key')
+
+            self.assertTrue(second.seen('key'))
+            self.assertFalse(second.seen('other'))
+            self.assertEqual(len(second), 1)
+            first.close()
+            second.close()
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestRabbitMqConsumerDedup(TestCase):
+
+    def test_should_ack_duplicates_without_calling_back(self):
+        store = MemoryDedupStore()
+        consumer = RabbitMqConsumer('', queue='queue_name', dedup=store)
+        callback = Mock(side_effect=[ValueError('failed'), None])
+        consumer.callback = consumer.validate_callback(lambda message: callback(message))
+        channel = consumer._channel = Mock()
+        properties = Mock(message_id='id-1', content_encoding=None)
+
+        consumer.on_message(channel, Mock(delivery_tag=1, redelivered=False), properties, b'body')
+        consumer.on_message(channel, Mock(delivery_tag=2, redelivered=True), properties, b'body')
+        consumer.on_message(channel, Mock(delivery_tag=3, redelivered=True), properties, b'body')
+
+        self.assertEqual(callback.call_count, 2)
+        channel.basic_reject.assert_called_once_with(1, True)
+        self.assertEqual([call[0] for call in channel.basic_ack.call_args_list], [(2, False), (3, False)])
+        self.assertEqual(store.stats(), dict(hits=1, misses=2, size=1))
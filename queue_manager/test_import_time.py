@@ -0,0 +1,31 @@
+import subprocess
+import sys
+from unittest import TestCase, skipIf
+
+try:
+    import pika  # noqa: F401
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+HEAVY_MODULES = ('pika', 'tornado', 'google', 'grpc')
+
+
+def loaded_modules(code):
+    script = '{}\nimport sys\nprint(" ".join(sorted(sys.modules)))'.format(code)
+    return set(subprocess.check_output([sys.executable, '-c', script], text=True).split())
+
+
+class TestImportTime(TestCase):
+
+    def test_should_not_import_backends_with_the_package(self):
+        modules = loaded_modules('import queue_manager')
+        self.assertEqual([name for name in HEAVY_MODULES if name in modules], [])
+
+    @skipIf(not pika_installed, "Skipping cause pika is not installed")
+    def test_should_load_backends_on_first_access(self):
+        modules = loaded_modules('from queue_manager import RabbitMqPublisher')
+        self.assertIn('queue_manager.rabbitmq_publisher', modules)
+        self.assertNotIn('google', modules)
+        self.assertNotIn('tornado', modules)
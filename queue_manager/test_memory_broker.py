@@ -0,0 +1,67 @@
+import multiprocessing
+from queue import Full
+from threading import Event, Thread
+from unittest import TestCase
+
+from .memory_broker import MemoryBroker, MemoryConsumer, MemoryPublisher
+
+
+def publish(broker):
+    MemoryPublisher('queue_name', broker=broker).publish_message('from child')
+
+
+class TestMemoryBroker(TestCase):
+
+    def test_should_deliver_decoded_messages(self):
+        broker = MemoryBroker()
+        MemoryPublisher('queue_name', broker=broker, codec='json').publish_message({'hello': 'world'})
+        consumer = MemoryConsumer('queue_name', broker=broker, codec='auto')
+        received = []
+
+        def callback(message):
+            received.append(message)
+            consumer.stop()
+        consumer.start_listening(callback)
+
+        self.assertEqual(received, [{'hello': 'world'}])
+        self.assertEqual(broker.message_count('queue_name'), 0)
+
+    def test_should_requeue_once_then_reject(self):
+        broker = MemoryBroker()
+        MemoryPublisher('queue_name', broker=broker).publish_message('fail')
+        consumer = MemoryConsumer('queue_name', broker=broker, poll_interval=0.01)
+        attempts = []
+        retried = Event()
+
+        def callback(message, properties):
+            attempts.append(message)
+            if len(attempts) == 2:
+                retried.set()
+            raise ValueError(message)
+        listener = Thread(target=consumer.start_listening, args=(callback,))
+        listener.start()
+        retried.wait(timeout=5)
+        consumer.stop()
+        listener.join()
+
+        self.assertEqual(attempts, [b'fail', b'fail'])
+        self.assertEqual(broker.message_count('queue_name'), 0)
+
+    def test_should_bound_queue(self):
+        publisher = MemoryPublisher('queue_name', broker=MemoryBroker(maxsize=2), block=False)
+
+        result = publisher.publish_batch(['one', 'two', 'three'])
+
+        self.assertEqual(result.confirmed, ['one', 'two'])
+        self.assertEqual(result.nacked, ['three'])
+        self.assertRaises(Full, publisher.publish_message, 'four')
+
+    def test_should_share_queues_with_processes(self):
+        broker = MemoryBroker(transport='process')
+        broker.queue('queue_name')
+
+        process = multiprocessing.Process(target=publish, args=(broker,))
+        process.start()
+        process.join()
+
+        self.assertEqual(broker.queue('queue_name').get(timeout=5)[0], b'from child')
@@ -0,0 +1,47 @@
+from unittest import TestCase, skipIf
+from unittest.mock import Mock
+
+from .metrics import InMemoryMetrics, PrometheusMetrics
+
+try:
+    from .rabbitmq_consumer import RabbitMqConsumer
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+
+class TestMetrics(TestCase):
+
+    def test_should_render_prometheus_text(self):
+        metrics = PrometheusMetrics(namespace='test', labels=dict(queue='orders'))
+        metrics.increment('messages_acked', 2)
+        metrics.gauge('messages_in_flight', 3)
+        metrics.observe('callback_seconds', 0.2)
+        metrics.observe('callback_seconds', 20)
+
+        text = metrics.render()
+
+        self.assertIn('test_messages_acked_total{queue="orders"} 2', text)
+        self.assertIn('test_messages_in_flight{queue="orders"} 3', text)
+        self.assertIn('test_callback_seconds_bucket{le="0.25",queue="orders"} 1', text)
+        self.assertIn('test_callback_seconds_bucket{le="+Inf",queue="orders"} 2', text)
+        self.assertIn('test_callback_seconds_count{queue="orders"} 2', text)
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestRabbitMqConsumerMetrics(TestCase):
+
+    def test_should_count_acks_and_rejects(self):
+        metrics = InMemoryMetrics()
+        consumer = RabbitMqConsumer('', queue='queue_name', metrics=metrics)
+        consumer.callback = consumer.validate_callback(lambda message: message == b'ok' or 1 / 0)
+        channel = consumer._channel = Mock()
+
+        consumer.on_message(channel, Mock(delivery_tag=1), None, b'ok')
+        consumer.on_message(channel, Mock(delivery_tag=2, redelivered=False), None, b'fail')
+        consumer.on_message(channel, Mock(delivery_tag=3, redelivered=True), None, b'fail')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], dict(messages_acked=1, messages_requeued=1, messages_rejected=1))
+        self.assertEqual(snapshot['histograms']['callback_seconds']['count'], 3)
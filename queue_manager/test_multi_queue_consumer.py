@@ -0,0 +1,106 @@
+from concurrent.futures import Executor, Future
+from unittest import TestCase, skipIf
+from unittest.mock import Mock, call
+
+from .metrics import InMemoryMetrics
+
+try:
+    from .multi_queue_consumer import MultiQueueConsumer, Subscription
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+
+def run_dispatches(consumer):
+    """Run the scheduled dispatches until none is left, like the ioloop would."""
+    while consumer._dispatch_id is not None:
+        consumer.ioloop.call_later.call_args[0][1]()
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestMultiQueueConsumer(TestCase):
+
+    def make_consumer(self, *subscriptions, **kwargs):
+        consumer = MultiQueueConsumer('', subscriptions, **kwargs)
+        consumer._connection = Mock()
+        consumer._channel = Mock()
+        consumer._ioloop = Mock()
+        return consumer
+
+    def deliver(self, consumer, queue, tag, message=b'message'):
+        subscription = next(subscription for subscription in consumer.subscriptions if subscription.queue == queue)
+        consumer.on_delivery(subscription, consumer._channel, Mock(delivery_tag=tag, redelivered=False), None, message)
+
+    def test_should_set_prefetch_of_each_queue_before_consuming_it(self):
+        consumer = self.make_consumer(Subscription('urgent', prefetch_count=4), Subscription('bulk', prefetch_count=50))
+        channel = consumer._channel
+
+        consumer.start_consuming()
+
+        self.assertEqual([name for name, _, _ in channel.method_calls if name in ('basic_qos', 'basic_consume')],
+                         ['basic_qos', 'basic_consume', 'basic_qos', 'basic_consume'])
+        self.assertEqual(channel.basic_qos.call_args_list, [call(prefetch_count=4), call(prefetch_count=50)])
+        self.assertEqual([kwargs['queue'] for _, kwargs in channel.basic_consume.call_args_list], ['urgent', 'bulk'])
+
+    def test_should_observe_the_downtime_once_consuming_again(self):
+        metrics = InMemoryMetrics()
+        consumer = self.make_consumer('one', 'two', metrics=metrics, reconnect_strategy=Mock())
+        consumer.reconnect_strategy.connected.return_value = 0.5
+
+        consumer.start_consuming()
+
+        consumer.reconnect_strategy.connected.assert_called_once_with()
+        self.assertEqual(metrics.snapshot()['histograms']['reconnect_seconds'], dict(count=1, sum=0.5))
+
+    def test_should_declare_and_bind_every_queue(self):
+        consumer = self.make_consumer('one', Subscription('two', routing_key='key.two'), exchange='events')
+        channel = consumer._channel
+        channel.queue_declare.side_effect = lambda callback, **kwargs: callback(None)
+        channel.queue_bind.side_effect = lambda callback, **kwargs: callback()
+        consumer.start_consuming = Mock()
+
+        consumer.setup_queue()
+        self.assertIsNone(consumer.queue)
+
+        self.assertEqual([kwargs['queue'] for _, kwargs in channel.queue_declare.call_args_list], ['one', 'two'])
+        self.assertEqual([(kwargs['queue'], kwargs['routing_key']) for _, kwargs in channel.queue_bind.call_args_list],
+                         [('one', None), ('two', 'key.two')])
+        consumer.start_consuming.assert_called_once_with()
+
+    def test_should_interleave_queues_by_weight(self):
+        consumer = self.make_consumer(Subscription('urgent', weight=3), Subscription('bulk', weight=1))
+        processed = []
+        consumer.callback = consumer.validate_callback(processed.append)
+        for tag in range(8):
+            self.deliver(consumer, 'bulk', tag, b'bulk')
+        for tag in range(8, 14):
+            self.deliver(consumer, 'urgent', tag, b'urgent')
+
+        run_dispatches(consumer)
+
+        self.assertEqual(processed[:8], [b'urgent', b'urgent', b'bulk', b'urgent'] * 2)
+        self.assertEqual(processed.count(b'bulk'), 8)
+        self.assertEqual(consumer._channel.basic_ack.call_count, 14)
+        self.assertEqual(consumer.stats()['bulk'], dict(pending=0, in_flight=0, dispatched=8))
+
+    def test_should_keep_slots_free_for_other_queues(self):
+        executor = Mock(spec=Executor)
+        executor.submit.side_effect = lambda *args: Future()
+        consumer = self.make_consumer(Subscription('urgent', weight=1),
+                                      Subscription('bulk', weight=10, max_in_flight=2),
+                                      worker_pool=executor, concurrency=3)
+        consumer.callback = consumer.validate_callback(lambda message: None)
+        consumer._executor = consumer.setup_executor()
+        for tag in range(5):
+            self.deliver(consumer, 'bulk', tag, b'bulk')
+        run_dispatches(consumer)
+        self.assertEqual(consumer.stats()['bulk'], dict(pending=3, in_flight=2, dispatched=2))
+
+        self.deliver(consumer, 'urgent', 5, b'urgent')
+        run_dispatches(consumer)
+
+        self.assertEqual([args[1] for args, _ in executor.submit.call_args_list], [b'bulk', b'bulk', b'urgent'])
+        consumer.acknowledge_message(0)
+        run_dispatches(consumer)
+        self.assertEqual(consumer.stats()['bulk'], dict(pending=2, in_flight=2, dispatched=3))
@@ -1,8 +1,12 @@
+import zlib
 from unittest import TestCase, skipIf
-from unittest.mock import patch, Mock
+from unittest.mock import create_autospec, patch, Mock
 
 try:
+    from google.api_core.exceptions import NotFound
+    from google.cloud import pubsub_v1
     from .pubsub_consumer import PubsubConsumer
+    from .batch import BatchFailed
 except ModuleNotFoundError:
     pubsub_installed = False
 else:
@@ -15,3 +19,99 @@ class TestPubsubConsumer(TestCase):
     @patch("queue_manager.pubsub_consumer.Credentials", Mock())
     def test_should_initialize(self):
         self.assertIsInstance(PubsubConsumer(None, None, None, None), PubsubConsumer)
+
+    @patch("queue_manager.pubsub_consumer.Credentials", Mock())
+    def test_should_nack_only_failed_messages_of_batch(self):
+        consumer = PubsubConsumer(None, None, None, None, batch_size=2)
+
+        def callback(messages):
+            raise BatchFailed([0])
+        consumer.callback = callback
+        messages = [Mock(data=b'one'), Mock(data=b'two')]
+
+        for message in messages:
+            consumer.on_message(message)
+
+        messages[0].nack.assert_called_once()
+        messages[1].ack.assert_called_once()
+        self.assertIsNone(consumer._batch_timer)
+
+    @patch("queue_manager.pubsub_consumer.Credentials", Mock())
+    def test_should_create_a_missing_subscription_with_the_client_signatures(self):
+        consumer = PubsubConsumer('project', None, 'subscription', 'topic')
+        consumer.client = create_autospec(pubsub_v1.SubscriberClient, instance=True)
+        consumer.client.topic_path.return_value = 'projects/project/topics/topic'
+        consumer.client.get_subscription.side_effect = NotFound('subscription')
+
+        consumer.start_listening(Mock())
+        self.assertFalse(consumer.ping())
+
+        consumer.client.get_subscription.assert_called_with(subscription='projects/project/subscriptions/subscription')
+        consumer.client.create_subscription.assert_called_once_with(
+            name='projects/project/subscriptions/subscription', topic='projects/project/topics/topic'
+        )
+
+    @patch("queue_manager.pubsub_consumer.Credentials", Mock())
+    def test_should_subscribe_with_flow_control_and_scheduler(self):
+        consumer = PubsubConsumer(None, None, None, None, max_messages=50, max_bytes=1024, max_lease_duration=600,
+                                  executor_workers=4)
+        consumer.client = Mock()
+
+        consumer.start_listening(Mock())
+
+        options = consumer.client.subscribe.call_args[1]
+        self.assertEqual(options['flow_control'].max_messages, 50)
+        self.assertEqual(options['flow_control'].max_bytes, 1024)
+        self.assertEqual(options['flow_control'].max_lease_duration, 600)
+        self.assertEqual(options['scheduler']._executor._max_workers, 4)
+
+    @patch("queue_manager.pubsub_consumer.Credentials", Mock())
+    def test_should_ack_each_pulled_batch_at_once(self):
+        consumer = PubsubConsumer(None, None, None, None)
+        consumer.client = Mock()
+        batch = [Mock(ack_id='a', message=Mock(data=b'one')), Mock(ack_id='b', message=Mock(data=b'two'))]
+        consumer.client.pull.side_effect = [Mock(received_messages=batch), Mock(received_messages=[])]
+
+        self.assertEqual(list(consumer.iter_batches(max_messages=2)), [[b'one', b'two']])
+        consumer.client.acknowledge.assert_called_once_with(subscription=consumer.subscription_path,
+                                                            ack_ids=['a', 'b'])
+
+    @patch("queue_manager.pubsub_consumer.Credentials", Mock())
+    def test_should_drain_nacking_failed_messages(self):
+        consumer = PubsubConsumer(None, None, None, None)
+        consumer.client = Mock()
+        batch = [Mock(ack_id='a', message=Mock(data=b'one')), Mock(ack_id='b', message=Mock(data=b'two'))]
+        consumer.client.pull.side_effect = [Mock(received_messages=batch), Mock(received_messages=[])]
+
+        def callback(messages):
+            raise BatchFailed([1])
+
+        self.assertEqual(consumer.drain(callback), 1)
+        consumer.client.acknowledge.assert_called_once_with(subscription=consumer.subscription_path, ack_ids=['a'])
+        consumer.client.modify_ack_deadline.assert_called_once_with(subscription=consumer.subscription_path,
+                                                                    ack_ids=['b'], ack_deadline_seconds=0)
+
+    @patch("queue_manager.pubsub_consumer.Credentials", Mock())
+    def test_should_stop_draining_messages_failing_every_attempt(self):
+        consumer = PubsubConsumer(None, None, None, None)
+        consumer.client = Mock()
+        poison = Mock(ack_id='a', message=Mock(data=b'poison', message_id='1'))
+        consumer.client.pull.return_value = Mock(received_messages=[poison])
+        callback = Mock(side_effect=ValueError('poison'))
+
+        self.assertEqual(consumer.drain(callback, max_attempts=2), 0)
+        self.assertEqual(callback.call_count, 2)
+        self.assertEqual(consumer.client.modify_ack_deadline.call_count, 3)
+        consumer.client.acknowledge.assert_not_called()
+
+    @patch("queue_manager.pubsub_consumer.Credentials", Mock())
+    def test_should_decompress_and_decode_message(self):
+        consumer = PubsubConsumer(None, None, None, None, codec='auto')
+        consumer.callback = Mock()
+        message = Mock(data=zlib.compress(b'{"hello":"world"}'),
+                       attributes=dict(content_type='application/json', content_encoding='zlib'))
+
+        consumer.on_message(message)
+
+        consumer.callback.assert_called_once_with({'hello': 'world'})
+        message.ack.assert_called_once_with()
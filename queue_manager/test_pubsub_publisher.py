@@ -1,8 +1,15 @@
+from concurrent.futures import Future
+from threading import Timer
 from unittest import TestCase, skipIf
-from unittest.mock import patch, Mock
+from unittest.mock import create_autospec, patch, Mock
+
+from .client_cache import ClientCache
+from .metrics import InMemoryMetrics
 
 try:
-    from .pubsub_publisher import PubsubPublisher
+    from google.api_core.exceptions import NotFound
+    from google.cloud import pubsub_v1
+    from .pubsub_publisher import PubsubPublisher, PubsubRoutingPublisher
 except ModuleNotFoundError:
     pubsub_installed = False
 else:
@@ -15,3 +22,106 @@ class TestPubsubPublisher(TestCase):
     @patch("queue_manager.pubsub_publisher.Credentials", Mock())
     def test_should_initialize(self):
         self.assertIsInstance(PubsubPublisher(None, None, None), PubsubPublisher)
+
+    @patch("queue_manager.pubsub_publisher.PubsubPublisher.client_cache", new_callable=ClientCache)
+    @patch("queue_manager.pubsub_publisher.Credentials", Mock())
+    @patch("queue_manager.pubsub_publisher.pubsub_v1.PublisherClient")
+    def test_should_publish_without_waiting_and_flush(self, client_class, cache):
+        futures = [Future(), Future()]
+        client_class.return_value.publish.side_effect = futures
+        publisher = PubsubPublisher('project', None, 'topic', batch_settings=dict(max_messages=100),
+                                    publisher_options=dict(flow_control=dict(message_limit=1000)))
+        callback = Mock()
+
+        publisher.publish_message_async('one', callback=callback)
+        publisher.publish_message_async(b'two')
+        futures[0].set_result('id-1')
+        Timer(0.05, futures[1].set_exception, (ValueError('failed'),)).start()
+
+        self.assertEqual(len(publisher.flush(timeout=5)), 1)
+        callback.assert_called_once_with(futures[0])
+        self.assertEqual(publisher._futures, set())
+        options = client_class.call_args[1]
+        self.assertEqual(options['batch_settings'].max_messages, 100)
+        self.assertEqual(options['publisher_options'].flow_control.message_limit, 1000)
+
+    @patch("queue_manager.pubsub_publisher.PubsubPublisher.client_cache", new_callable=ClientCache)
+    @patch("queue_manager.pubsub_publisher.Credentials", Mock())
+    @patch("queue_manager.pubsub_publisher.pubsub_v1.PublisherClient")
+    def test_should_gauge_messages_in_flight(self, client_class, cache):
+        futures = [Future(), Future()]
+        client_class.return_value.publish.side_effect = futures
+        metrics = InMemoryMetrics()
+        publisher = PubsubPublisher('project', None, 'topic', metrics=metrics)
+
+        publisher.publish_message_async('one')
+        publisher.publish_message_async('two')
+        self.assertEqual(metrics.gauges['messages_in_flight'], 2)
+
+        futures[0].set_result('id-1')
+        self.assertEqual(metrics.gauges['messages_in_flight'], 1)
+        futures[1].set_result('id-2')
+        self.assertEqual(metrics.gauges['messages_in_flight'], 0)
+
+    @patch("queue_manager.pubsub_publisher.Credentials", Mock())
+    def test_should_create_a_missing_topic_with_the_client_signatures(self):
+        publisher = PubsubPublisher('project', None, 'topic')
+        publisher.client = create_autospec(pubsub_v1.PublisherClient, instance=True)
+        publisher.client.get_topic.side_effect = NotFound('topic')
+
+        publisher.assert_topic('projects/project/topics/topic')
+
+        publisher.client.get_topic.assert_called_once_with(topic='projects/project/topics/topic')
+        publisher.client.create_topic.assert_called_once_with(name='projects/project/topics/topic')
+
+    @patch("queue_manager.pubsub_publisher.PubsubPublisher.client_cache", new_callable=ClientCache)
+    @patch("queue_manager.pubsub_publisher.Credentials")
+    @patch("queue_manager.pubsub_publisher.pubsub_v1.PublisherClient")
+    def test_should_share_client_between_topics(self, client_class, credentials_class, cache):
+        publishers = [PubsubPublisher('project', 'sa.json', topic) for topic in ('one', 'two')]
+        other = PubsubPublisher('project', 'sa.json', 'three', batch_settings=dict(max_messages=10))
+
+        self.assertIs(publishers[0].client, publishers[1].client)
+        other.client
+        self.assertEqual(client_class.call_count, 2)
+        credentials_class.from_service_account_file.assert_called_once()
+
+        publishers[0].close()
+        client_class.return_value.stop.assert_not_called()
+        publishers[1].close()
+        client_class.return_value.stop.assert_called_once()
+
+    @patch("queue_manager.pubsub_publisher.PubsubPublisher.client_cache", new_callable=ClientCache)
+    @patch("queue_manager.pubsub_publisher.Credentials", Mock())
+    @patch("queue_manager.pubsub_publisher.pubsub_v1.PublisherClient")
+    def test_should_publish_batch_per_topic(self, client_class, cache):
+        futures = [Future(), Future(), Future()]
+        futures[0].set_result('id-1')
+        futures[1].set_exception(ValueError('failed'))
+        futures[2].set_result('id-3')
+        client_class.return_value.publish.side_effect = futures
+        router = PubsubRoutingPublisher('project', None)
+
+        results = router.publish_batch([('one', 'a'), ('two', 'b', dict(origin='api')), ('one', 'c')])
+
+        self.assertEqual(results['one'].confirmed, ['a', 'c'])
+        self.assertEqual(results['two'].nacked, [('b', dict(origin='api'))])
+        topics = [call[0][0] for call in client_class.return_value.publish.call_args_list]
+        self.assertEqual(topics, ['projects/project/topics/one', 'projects/project/topics/two',
+                                  'projects/project/topics/one'])
+
+    @patch("queue_manager.pubsub_publisher.PubsubPublisher.client_cache", new_callable=ClientCache)
+    @patch("queue_manager.pubsub_publisher.Credentials", Mock())
+    @patch("queue_manager.pubsub_publisher.pubsub_v1.PublisherClient")
+    def test_should_report_timed_out_publishes_apart_from_failures(self, client_class, cache):
+        futures = [Future(), Future(), Future()]
+        futures[0].set_result('id-1')
+        futures[1].set_exception(ValueError('failed'))
+        client_class.return_value.publish.side_effect = futures
+        router = PubsubRoutingPublisher('project', None)
+
+        results = router.publish_batch([('one', 'a'), ('one', 'b'), ('one', 'c')], timeout=0.01)
+
+        self.assertEqual(results['one'].confirmed, ['a'])
+        self.assertEqual(results['one'].nacked, ['b'])
+        self.assertEqual(results['one'].timed_out, ['c'])
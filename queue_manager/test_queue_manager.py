@@ -1,7 +1,10 @@
 from unittest import TestCase, skipIf
+from unittest.mock import patch, Mock, call
 
 try:
-    from .queue_manager import QueueManager
+    from .queue_manager import QueueManager, ACK_BATCH, ACK_MANUAL
+    from .topology import topology_cache
+    from pika.exceptions import StreamLostError
 except ModuleNotFoundError:
     pika_installed = False
 else:
@@ -13,3 +16,108 @@ class TestQueueManager(TestCase):
 
     def test_should_initialize(self):
         self.assertIsInstance(QueueManager({}), QueueManager)
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_declare_queue_once(self, connection_class):
+        topology_cache.invalidate()
+        qm = QueueManager({'host': 'localhost', 'port': 5672})
+
+        qm.push('hello', 'one')
+        qm.push('hello', 'two')
+
+        channel = connection_class.return_value.channel.return_value
+        channel.queue_declare.assert_called_once_with(queue='hello')
+        self.assertEqual(channel.basic_publish.call_count, 2)
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_keep_connection_alive(self, connection_class):
+        qm = QueueManager({'host': 'localhost', 'port': 5672}, keep_alive=True)
+        connection_class.return_value.channel.return_value.basic_get.return_value = (None, None, None)
+
+        qm.push('hello', 'one')
+        qm.pop('hello')
+
+        connection_class.assert_called_once()
+        connection_class.return_value.channel.assert_called_once()
+        connection_class.return_value.close.assert_not_called()
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_reconnect_when_connection_drops(self, connection_class):
+        qm = QueueManager({'host': 'localhost', 'port': 5672}, keep_alive=True)
+        channel = connection_class.return_value.channel.return_value
+        channel.basic_publish.side_effect = [StreamLostError('lost'), None]
+
+        qm.push('hello', 'one')
+
+        self.assertEqual(connection_class.call_count, 2)
+        self.assertEqual(channel.basic_publish.call_count, 2)
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_ack_batches_while_iterating_queue(self, connection_class):
+        qm = QueueManager({'host': 'localhost', 'port': 5672})
+        channel = connection_class.return_value.channel.return_value
+        channel.consume.return_value = iter([(Mock(delivery_tag=tag), None, tag) for tag in range(1, 6)] +
+                                            [(None, None, None)])
+
+        bodies = list(qm.iter_queue('hello', prefetch=2, ack=ACK_BATCH))
+
+        self.assertEqual(bodies, [1, 2, 3, 4, 5])
+        self.assertEqual(channel.basic_ack.call_args_list, [call(delivery_tag=2, multiple=True),
+                                                            call(delivery_tag=4, multiple=True),
+                                                            call(delivery_tag=5, multiple=True)])
+        channel.basic_reject.assert_not_called()
+        channel.cancel.assert_called_once()
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_requeue_unacked_messages_when_stopping_early(self, connection_class):
+        qm = QueueManager({'host': 'localhost', 'port': 5672})
+        channel = connection_class.return_value.channel.return_value
+        channel.consume.return_value = iter([(Mock(delivery_tag=tag), None, tag) for tag in range(1, 4)])
+
+        for body, ack in qm.iter_queue('hello', ack=ACK_MANUAL):
+            if body == 1:
+                ack()
+            if body == 2:
+                break
+
+        channel.basic_ack.assert_called_once_with(delivery_tag=1, multiple=False)
+        channel.basic_reject.assert_called_once_with(delivery_tag=2, requeue=True)
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_raise_when_holding_prefetch_unacked_messages(self, connection_class):
+        qm = QueueManager({'host': 'localhost', 'port': 5672})
+        channel = connection_class.return_value.channel.return_value
+        # the broker stops delivering once prefetch messages are unacked
+        channel.consume.return_value = iter([(Mock(delivery_tag=tag), None, tag) for tag in range(1, 3)] +
+                                            [(None, None, None)])
+
+        with self.assertRaises(RuntimeError):
+            for body, ack in qm.iter_queue('hello', prefetch=2, ack=ACK_MANUAL):
+                pass
+
+        self.assertEqual(channel.basic_reject.call_args_list, [call(delivery_tag=1, requeue=True),
+                                                               call(delivery_tag=2, requeue=True)])
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_ack_yielded_batch_messages_when_stopping_early(self, connection_class):
+        qm = QueueManager({'host': 'localhost', 'port': 5672}, keep_alive=True)
+        channel = connection_class.return_value.channel.return_value
+        channel.consume.return_value = iter([(Mock(delivery_tag=tag), None, tag) for tag in range(1, 6)])
+
+        for body in qm.iter_queue('hello', prefetch=10, ack=ACK_BATCH):
+            if body == 3:
+                break
+
+        channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+        channel.basic_reject.assert_not_called()
+        self.assertEqual(channel.basic_qos.call_args_list, [call(prefetch_count=10), call(prefetch_count=0)])
+
+    @patch("queue_manager.queue_manager.pika.BlockingConnection")
+    def test_should_pop_many(self, connection_class):
+        qm = QueueManager({'host': 'localhost', 'port': 5672})
+        channel = connection_class.return_value.channel.return_value
+        channel.consume.return_value = iter([(Mock(delivery_tag=tag), None, tag) for tag in range(1, 4)])
+
+        self.assertEqual(qm.pop_many('hello', 2), [1, 2])
+        self.assertEqual(channel.basic_ack.call_count, 2)
+        self.assertEqual(channel.basic_qos.call_args_list, [call(prefetch_count=2), call(prefetch_count=0)])
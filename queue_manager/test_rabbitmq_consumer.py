@@ -1,7 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase, skipIf
+from unittest.mock import Mock, call
 
 try:
     from .rabbitmq_consumer import RabbitMqConsumer
+    from .batch import BatchFailed
 except ModuleNotFoundError:
     pika_installed = False
 else:
@@ -13,3 +16,68 @@ class TestRabbitMqConsumer(TestCase):
 
     def test_should_initialize(self):
         self.assertIsInstance(RabbitMqConsumer(''), RabbitMqConsumer)
+
+    def test_should_settle_worker_pool_messages_on_ioloop(self):
+        consumer = RabbitMqConsumer('', queue='queue_name', prefetch_count=4, worker_pool=ThreadPoolExecutor(2))
+        consumer.callback = consumer.validate_callback(lambda message: message == b'ok' or 1 / 0)
+        consumer._executor = consumer.setup_executor()
+        consumer._connection = Mock()
+        consumer._connection.ioloop.add_callback_threadsafe.side_effect = lambda callback: callback()
+        channel = consumer._channel = Mock()
+
+        consumer.on_message(channel, Mock(delivery_tag=1), None, b'ok')
+        consumer.on_message(channel, Mock(delivery_tag=2, redelivered=False), None, b'fail')
+        consumer._executor.shutdown(wait=True)
+
+        channel.basic_ack.assert_called_once_with(1, False)
+        channel.basic_reject.assert_called_once_with(2, True)
+        self.assertEqual(consumer._in_flight, 0)
+
+    def test_should_ack_batch_with_multiple_ack(self):
+        consumer = RabbitMqConsumer('', queue='queue_name', batch_size=2)
+        callback = Mock()
+        consumer.callback = consumer.validate_callback(lambda messages: callback(messages))
+        consumer._connection = Mock()
+        ioloop = consumer._ioloop = Mock()
+        channel = consumer._channel = Mock()
+
+        consumer.on_message(channel, Mock(delivery_tag=1), None, b'one')
+        callback.assert_not_called()
+        consumer.on_message(channel, Mock(delivery_tag=2), None, b'two')
+
+        callback.assert_called_once_with([b'one', b'two'])
+        channel.basic_ack.assert_called_once_with(2, True)
+        ioloop.remove_timeout.assert_called_once_with(ioloop.call_later.return_value)
+
+    def test_should_leave_unsettled_tags_of_a_new_channel_to_a_batch_of_the_closed_one(self):
+        consumer = RabbitMqConsumer('', queue='queue_name', batch_size=2)
+        consumer._connection = Mock()
+        consumer._ioloop = Mock()
+        closed = Mock()
+        channel = consumer._channel = Mock()
+        # delivery tag 1 of the new channel is in a batch still filling
+        consumer._unsettled = {1}
+        future = Mock()
+        future.exception.return_value = None
+
+        consumer.settle_batch([(closed, Mock(delivery_tag=1), None, b'one')], future)
+
+        self.assertEqual(consumer._unsettled, {1})
+        closed.basic_ack.assert_not_called()
+        channel.basic_ack.assert_not_called()
+
+    def test_should_reject_only_failed_messages_of_batch(self):
+        consumer = RabbitMqConsumer('', queue='queue_name', batch_size=3)
+
+        def callback(messages):
+            raise BatchFailed([1])
+        consumer.callback = consumer.validate_callback(callback)
+        consumer._connection = Mock()
+        consumer._ioloop = Mock()
+        channel = consumer._channel = Mock()
+
+        for tag in (1, 2, 3):
+            consumer.on_message(channel, Mock(delivery_tag=tag, redelivered=False), None, b'message')
+
+        self.assertEqual(channel.basic_ack.call_args_list, [call(1, False), call(3, False)])
+        channel.basic_reject.assert_called_once_with(2, True)
@@ -1,7 +1,10 @@
 from unittest import TestCase, skipIf
+from unittest.mock import patch, Mock
 
 try:
-    from .rabbitmq_publisher import RabbitMqPublisher
+    from .rabbitmq_publisher import RabbitMqPublisher, RabbitMqRoutingPublisher
+    from pika.spec import Basic
+    from .topology import topology_cache
 except ModuleNotFoundError:
     pika_installed = False
 else:
@@ -11,5 +14,69 @@ else:
 @skipIf(not pika_installed, "Skipping cause pika is not installed")
 class TestRabbitMqPublisher(TestCase):
 
+    def setUp(self):
+        topology_cache.invalidate()
+
     def test_should_initialize(self):
         self.assertIsInstance(RabbitMqPublisher(''), RabbitMqPublisher)
+
+    @patch("queue_manager.connection_pool.pika.BlockingConnection")
+    def test_should_keep_pooled_connection_between_publishes(self, connection_class):
+        publisher = RabbitMqPublisher('amqp://', queue='queue_name', pool_size=2)
+
+        publisher.publish_message('one')
+        publisher.publish_message('two')
+
+        connection_class.assert_called_once()
+        channel = connection_class.return_value.channel.return_value
+        channel.queue_declare.assert_called_once()
+        self.assertEqual(channel.basic_publish.call_count, 2)
+
+    @patch("queue_manager.rabbitmq_publisher.pika.BlockingConnection")
+    def test_should_cache_declarations_of_a_list_of_urls(self, connection_class):
+        publisher = RabbitMqPublisher(['amqp://one', 'amqp://two'], queue='queue_name')
+
+        publisher.publish_message('one')
+        publisher.publish_message('two')
+
+        channel = connection_class.return_value.channel.return_value
+        channel.queue_declare.assert_called_once()
+        self.assertEqual(channel.basic_publish.call_count, 2)
+
+    @patch("queue_manager.rabbitmq_publisher.pika.BlockingConnection")
+    def test_should_report_nacked_messages_on_batch(self, connection_class):
+        channel = connection_class.return_value.channel.return_value
+        channel.is_open = True
+        channel.connection = connection_class.return_value
+        channel._impl.confirm_delivery.side_effect = lambda on_confirm, callback: callback(None)
+
+        def confirm(time_limit):
+            on_confirm = channel._impl.confirm_delivery.call_args[0][0]
+            on_confirm(Mock(method=Basic.Ack(delivery_tag=2, multiple=True)))
+            on_confirm(Mock(method=Basic.Nack(delivery_tag=3)))
+        connection_class.return_value.process_data_events.side_effect = confirm
+
+        publisher = RabbitMqPublisher('amqp://', queue='queue_name')
+        result = publisher.publish_batch(['one', 'two', ('three', dict(priority=8))])
+
+        self.assertEqual(channel._impl.basic_publish.call_count, 3)
+        self.assertEqual(result.confirmed, ['one', 'two'])
+        self.assertEqual(result.nacked, [('three', dict(priority=8))])
+        self.assertEqual(result.returned, [])
+        # raw channel confirms must wake process_data_events up
+        connection_class.return_value.add_callback_threadsafe.assert_called()
+
+    @patch("queue_manager.connection_pool.pika.BlockingConnection")
+    def test_should_route_over_one_pooled_connection(self, connection_class):
+        router = RabbitMqRoutingPublisher('amqp://')
+
+        router.publish('one', 'hello')
+        router.publish('two', 'hello')
+        router.publish('one', 'again')
+
+        connection_class.assert_called_once()
+        channel = connection_class.return_value.channel.return_value
+        self.assertEqual([call[1]['queue'] for call in channel.queue_declare.call_args_list], ['one', 'two'])
+        self.assertEqual([call[1]['routing_key'] for call in channel.basic_publish.call_args_list],
+                         ['one', 'two', 'one'])
+        router.close()
@@ -0,0 +1,54 @@
+from unittest import TestCase, skipIf
+from unittest.mock import Mock
+
+from .reconnect import ReconnectStrategy
+
+try:
+    from .rabbitmq_consumer import RabbitMqConsumer
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+
+class TestReconnectStrategy(TestCase):
+
+    def test_should_retry_at_once_then_back_off(self):
+        strategy = ReconnectStrategy(base_delay=0.1, max_delay=0.3, jitter=0, max_attempts=4)
+        self.assertEqual([strategy.next_delay(ConnectionError()) for _ in range(5)], [0, 0.1, 0.2, 0.3, None])
+
+        strategy.jitter = 0.5
+        self.assertTrue(all(0.1 <= strategy.delay(3) <= 0.2 for _ in range(100)))
+
+    def test_should_rotate_urls_and_report_reconnects(self):
+        on_reconnect = Mock()
+        strategy = ReconnectStrategy(on_reconnect=on_reconnect)
+        urls = ('one', 'two', 'three')
+        self.assertEqual(strategy.order(urls), urls)
+        self.assertIsNone(strategy.connected())
+
+        strategy.next_delay(ConnectionError())
+        self.assertEqual(strategy.order(urls), ('two', 'three', 'one'))
+        strategy.next_delay(ConnectionError())
+        self.assertEqual(strategy.order(urls), ('three', 'one', 'two'))
+        downtime = strategy.connected()
+
+        on_reconnect.assert_called_once_with(downtime)
+        self.assertEqual(strategy.stats()['disconnects'], 1)
+        self.assertEqual(strategy.stats()['reconnects'], 1)
+        self.assertEqual(strategy.attempts, 0)
+        self.assertEqual(sorted(ReconnectStrategy(failover='random').order(urls)), sorted(urls))
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestConsumerReconnect(TestCase):
+
+    def test_should_retry_failed_connections(self):
+        consumer = RabbitMqConsumer(('amqp://one', 'amqp://two'), queue='queue_name',
+                                    reconnect_strategy=ReconnectStrategy(jitter=0))
+        consumer._ioloop = Mock()
+
+        consumer.on_connection_open(ConnectionError())
+
+        consumer._ioloop.call_later.assert_called_once_with(0, consumer.reconnect)
+        self.assertEqual([url.host for url in consumer.connection_urls()], ['two', 'one'])
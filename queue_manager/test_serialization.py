@@ -0,0 +1,108 @@
+from threading import Thread
+from unittest import TestCase, skipIf
+from unittest.mock import Mock
+
+from .compression import get_compressor
+from .serialization import JsonCodec, PickleCodec, decode, get_codec
+
+try:
+    from .rabbitmq_publisher import RabbitMqPublisher
+    from .rabbitmq_consumer import RabbitMqConsumer
+except ModuleNotFoundError:
+    pika_installed = False
+else:
+    pika_installed = True
+
+try:
+    import zstandard  # noqa: F401
+except ModuleNotFoundError:
+    zstandard_installed = False
+else:
+    zstandard_installed = True
+
+
+class TestSerialization(TestCase):
+
+    def test_should_decode_by_content_type(self):
+        body = JsonCodec().encode({'hello': ['world', 1]})
+
+        self.assertEqual(decode(body, 'application/json', 'auto'), {'hello': ['world', 1]})
+        self.assertEqual(decode(memoryview(body), 'application/json', get_codec('json')), {'hello': ['world', 1]})
+        self.assertIs(decode(body, None, 'auto'), body)
+
+    def test_should_decode_pickle_only_when_configured(self):
+        body = PickleCodec().encode({'hello'})
+
+        self.assertIs(decode(body, PickleCodec.content_type, 'auto'), body)
+        self.assertEqual(decode(body, PickleCodec.content_type, get_codec('pickle')), {'hello'})
+
+    def test_should_reject_unknown_codec(self):
+        self.assertRaises(ValueError, get_codec, 'yaml')
+
+    @skipIf(not zstandard_installed, "Skipping cause zstandard is not installed")
+    def test_should_give_each_thread_its_own_zstd_compressor(self):
+        compressor = get_compressor('zstd')
+        compressors = []
+        thread = Thread(target=lambda: compressors.append(compressor.compressor))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(compressors[0], compressor.compressor)
+        self.assertIs(compressor.compressor, compressor.compressor)
+        self.assertEqual(compressor.decompress(compressor.compress(b'x' * 100)), b'x' * 100)
+
+
+@skipIf(not pika_installed, "Skipping cause pika is not installed")
+class TestRabbitMqSerialization(TestCase):
+
+    def test_should_record_content_type_on_publish(self):
+        publisher = RabbitMqPublisher('', queue='queue_name', codec='json')
+
+        params = publisher.get_publish_params({'hello': 'world'}, dict(priority=8))
+
+        self.assertEqual(params['body'], b'{"hello":"world"}')
+        self.assertEqual(params['properties'].content_type, 'application/json')
+        self.assertEqual(params['properties'].priority, 8)
+
+    def test_should_decode_before_callback(self):
+        consumer = RabbitMqConsumer('', queue='queue_name', codec='auto')
+        callback = Mock()
+        consumer.callback = consumer.validate_callback(lambda message: callback(message))
+        channel = consumer._channel = Mock()
+
+        consumer.on_message(channel, Mock(delivery_tag=1), Mock(content_type='application/json'), b'{"a":1}')
+        consumer.on_message(channel, Mock(delivery_tag=2), Mock(content_type='application/json'), b'{broken')
+
+        callback.assert_called_once_with({'a': 1})
+        channel.basic_ack.assert_called_once_with(1, False)
+        channel.basic_reject.assert_called_once_with(2, False)
+
+    def test_should_compress_above_threshold(self):
+        publisher = RabbitMqPublisher('', queue='queue_name', codec='json', compression='zlib',
+                                      compression_threshold=100)
+
+        small = publisher.get_publish_params(['x'], None)
+        large = publisher.get_publish_params(['x'] * 100, None)
+
+        self.assertIsNone(small['properties'].content_encoding)
+        self.assertEqual(large['properties'].content_encoding, 'zlib')
+        self.assertLess(len(large['body']), 100)
+
+        consumer = RabbitMqConsumer('', queue='queue_name', codec='auto')
+        callback = Mock()
+        consumer.callback = consumer.validate_callback(lambda message: callback(message))
+        consumer._channel = Mock()
+        consumer.on_message(consumer._channel, Mock(delivery_tag=1), large['properties'], large['body'])
+
+        callback.assert_called_once_with(['x'] * 100)
+
+    def test_should_keep_content_type_and_encoding_of_codec_and_compression(self):
+        publisher = RabbitMqPublisher('', queue='queue_name', codec='json', compression='zlib',
+                                      compression_threshold=0)
+
+        params = publisher.get_publish_params(['x'], dict(content_type='text/plain', content_encoding='utf-8',
+                                                          priority=1))
+
+        self.assertEqual(params['properties'].content_type, 'application/json')
+        self.assertEqual(params['properties'].content_encoding, 'zlib')
+        self.assertEqual(params['properties'].priority, 1)
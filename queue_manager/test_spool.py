@@ -0,0 +1,151 @@
+import os
+from tempfile import TemporaryDirectory
+from threading import Event
+from time import monotonic
+from unittest import TestCase, skipIf
+
+from .memory_broker import MemoryBroker, MemoryPublisher
+from .spool import TRANSIENT_ERRORS, Spool, SpoolingPublisher
+
+try:
+    from google.api_core.exceptions import NotFound, PermissionDenied, ServiceUnavailable
+except ModuleNotFoundError:
+    pubsub_installed = False
+else:
+    pubsub_installed = True
+
+
+class FlakyPublisher(MemoryPublisher):
+    down = False
+    gate = None
+
+    def publish_message(self, message, message_properties=None):
+        if self.gate is not None:
+            self.gate.wait()
+        if self.down:
+            raise TimeoutError('broker is down')
+        if message == 'poison':
+            raise ValueError('cannot publish {}'.format(message))
+        return super(FlakyPublisher, self).publish_message(message, message_properties)
+
+
+class TestSpool(TestCase):
+
+    def test_should_keep_entries_across_segments_and_restarts(self):
+        with TemporaryDirectory() as directory:
+            spool = Spool(directory, segment_size=256)
+            for number in range(20):
+                spool.append('message {}'.format(number), dict(priority=number % 3))
+            entries, position = spool.read(5)
+            spool.commit(position, len(entries))
+            spool.close()
+            self.assertGreater(len([name for name in os.listdir(directory) if name.endswith('.segment')]), 1)
+
+            spool = Spool(directory, segment_size=256)
+            self.assertEqual(len(spool), 15)
+            entries, position = spool.read(100)
+            self.assertEqual(entries[0], ('message 5', dict(priority=2)))
+            self.assertEqual([message for message, _ in entries], ['message {}'.format(n) for n in range(5, 20)])
+            spool.commit(position, len(entries))
+            self.assertEqual(len(spool), 0)
+            spool.close()
+
+    def test_should_ignore_a_torn_record(self):
+        with TemporaryDirectory() as directory:
+            spool = Spool(directory)
+            spool.append('kept')
+            spool.append('torn')
+            segment = next(iter(spool.segments.values()))
+            segment.map[segment.end - 1:segment.end] = b'\0'
+            spool.close()
+
+            spool = Spool(directory)
+            self.assertEqual(spool.read(10)[0], [('kept', None)])
+            spool.append('after')
+            self.assertEqual(spool.read(10)[0], [('kept', None), ('after', None)])
+            spool.close()
+
+    def test_should_skip_an_empty_segment_left_by_a_crash(self):
+        with TemporaryDirectory() as directory:
+            spool = Spool(directory, segment_size=256)
+            spool.append('kept')
+            spool.close()
+            open(os.path.join(directory, '{:020d}.segment'.format(1)), 'wb').close()
+
+            spool = Spool(directory, segment_size=256)
+            self.assertEqual(spool.read(10)[0], [('kept', None)])
+            spool.append('after')
+            self.assertEqual(spool.read(10)[0], [('kept', None), ('after', None)])
+            spool.close()
+
+
+class TestSpoolingPublisher(TestCase):
+
+    def test_should_spool_while_down_and_replay_in_order(self):
+        broker = MemoryBroker()
+        flaky = FlakyPublisher('queue_name', broker=broker)
+        with TemporaryDirectory() as directory:
+            publisher = SpoolingPublisher(flaky, directory, batch_size=3, retry_interval=0.01)
+            publisher.publish_message('one')
+            flaky.down = True
+            for message in ('two', 'three', 'four', 'five'):
+                self.assertIsNone(publisher.publish_message(message))
+            self.assertEqual(broker.message_count('queue_name'), 1)
+
+            flaky.down = False
+            publisher.publish_message('six')
+            publisher.close(timeout=5)
+
+            queue = broker.queue('queue_name')
+            bodies = [queue.get(timeout=0)[0] for _ in range(broker.message_count('queue_name'))]
+            self.assertEqual(bodies, [b'one', b'two', b'three', b'four', b'five', b'six'])
+            self.assertEqual(len(Spool(directory)), 0)
+
+    def test_should_raise_errors_other_than_an_outage(self):
+        broker = MemoryBroker()
+        with TemporaryDirectory() as directory:
+            publisher = SpoolingPublisher(FlakyPublisher('queue_name', broker=broker), directory)
+            with self.assertRaises(ValueError):
+                publisher.publish_message('poison')
+            self.assertEqual(len(publisher.spool), 0)
+            publisher.close(timeout=5)
+
+    def test_should_dead_letter_messages_failing_their_replay(self):
+        broker = MemoryBroker()
+        flaky = FlakyPublisher('queue_name', broker=broker)
+        with TemporaryDirectory() as directory:
+            publisher = SpoolingPublisher(flaky, directory, retry_interval=0.01,
+                                          dead_letter=MemoryPublisher('dead_letters', broker=broker))
+            flaky.down = True
+            for message in ('one', 'poison', 'two'):
+                publisher.publish_message(message)
+            flaky.down = False
+            publisher.close(timeout=5)
+
+            queue = broker.queue('queue_name')
+            bodies = [queue.get(timeout=0)[0] for _ in range(broker.message_count('queue_name'))]
+            # the failed batch had published 'one' already, replaying one by one publishes it again
+            self.assertEqual(bodies, [b'one', b'one', b'two'])
+            self.assertEqual(broker.queue('dead_letters').get(timeout=0)[0], b'poison')
+            self.assertEqual(len(Spool(directory)), 0)
+
+    def test_should_not_wait_past_timeout_for_a_hung_publish(self):
+        flaky = FlakyPublisher('queue_name', broker=MemoryBroker())
+        with TemporaryDirectory() as directory:
+            publisher = SpoolingPublisher(flaky, directory, retry_interval=0.01)
+            flaky.down = True
+            publisher.publish_message('one')
+            flaky.gate = Event()
+            started = monotonic()
+
+            self.assertEqual(publisher.close(timeout=0.1), 1)
+            self.assertLess(monotonic() - started, 1)
+            flaky.gate.set()
+            publisher._drainer.join(1)
+            publisher.spool.close()
+
+    @skipIf(not pubsub_installed, "Skipping cause google-cloud-pubsub is not installed")
+    def test_should_spool_pubsub_outages_only(self):
+        self.assertTrue(issubclass(ServiceUnavailable, TRANSIENT_ERRORS))
+        self.assertFalse(issubclass(NotFound, TRANSIENT_ERRORS))
+        self.assertFalse(issubclass(PermissionDenied, TRANSIENT_ERRORS))
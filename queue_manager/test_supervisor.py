@@ -0,0 +1,63 @@
+import multiprocessing
+import pickle
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from . import supervisor
+from .supervisor import ConsumerSupervisor, CountingCallback, run_worker
+
+
+def record(message, properties):
+    return message
+
+
+class TestConsumerSupervisor(TestCase):
+
+    def test_should_count_processed_messages(self):
+        counter = multiprocessing.Value('Q', 0)
+        callback = CountingCallback(lambda message, properties: None, counter)
+
+        callback(b'one', None)
+        callback([b'two', b'three'], None)
+
+        self.assertEqual(counter.value, 3)
+
+    def test_should_count_in_forked_pools_once_pickled(self):
+        counter = multiprocessing.Value('Q', 0)
+        callback = pickle.loads(pickle.dumps(CountingCallback(record, counter)))
+
+        with patch.object(supervisor, '_worker_counter', counter):
+            self.assertEqual(callback(b'one', None), b'one')
+
+        self.assertEqual(counter.value, 1)
+
+    @patch("queue_manager.supervisor.signal.signal", Mock())
+    @patch("queue_manager.supervisor._worker_counter", None)
+    def test_should_exit_worker_when_consumer_stops_listening(self):
+        consumer = Mock()
+
+        run_worker(lambda: consumer, record, multiprocessing.Value('Q', 0))
+
+        consumer.start_listening.assert_called_once()
+        consumer.wait.assert_called_once_with()
+        consumer.stop.assert_not_called()
+
+    @patch("queue_manager.supervisor.monotonic", Mock(return_value=100))
+    def test_should_restart_crashed_worker_with_backoff(self):
+        supervisor = ConsumerSupervisor(Mock(), workers=1, min_backoff=1, max_backoff=8)
+        slot = supervisor.slots[0]
+        slot.process = Mock(**{'is_alive.return_value': False})
+        slot.started_at = 99
+        slot.failures = 3
+        supervisor.spawn = Mock()
+
+        supervisor.check(slot)
+
+        self.assertEqual(slot.restart_at, 108)
+        supervisor.spawn.assert_not_called()
+
+        slot.restart_at = 100
+        supervisor.check(slot)
+
+        supervisor.spawn.assert_called_once_with(slot)
+        self.assertEqual(slot.restarts, 1)
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+from .topology import TopologyCache, freeze
+
+
+class TestTopologyCache(TestCase):
+
+    def test_should_declare_once_within_ttl(self):
+        cache = TopologyCache(ttl=30)
+        declare = Mock()
+
+        cache.assert_declared('broker', ('queue', 'name', freeze({'x-max-priority': 10})), declare)
+        cache.assert_declared('broker', ('queue', 'name', freeze({'x-max-priority': 10})), declare)
+
+        declare.assert_called_once()
+
+    def test_should_declare_again_after_ttl(self):
+        cache = TopologyCache(ttl=30)
+        declare = Mock()
+
+        with patch("queue_manager.topology.time", Mock(side_effect=[100, 100, 131, 131])):
+            cache.assert_declared('broker', ('exchange', 'name', 'topic'), declare)
+            cache.assert_declared('broker', ('exchange', 'name', 'topic'), declare)
+
+        self.assertEqual(declare.call_count, 2)
+
+    def test_should_invalidate_connection_declarations(self):
+        cache = TopologyCache()
+        cache.assert_declared('broker', ('queue', 'name', None), Mock())
+        cache.assert_declared('other', ('queue', 'name', None), Mock())
+
+        cache.invalidate('broker')
+
+        self.assertFalse(cache.is_declared('broker', ('queue', 'name', None)))
+        self.assertTrue(cache.is_declared('other', ('queue', 'name', None)))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Process wide cache of RabbitMQ declarations.
+
+Like :meth:`PubsubPublisher.assert_topic`, queues, exchanges and bindings are
+asserted once per ``ttl`` for a given broker, so repeated publishes skip the
+redundant declare RPCs. Entries are invalidated when a channel closes.
+
+.. code:: python
+
+    from queue_manager.topology import topology_cache
+
+    topology_cache.assert_declared(urls, ('queue', 'queue_name', None),
+                                   lambda: channel.queue_declare(queue='queue_name'))
+"""
+import logging
+from collections.abc import Mapping
+from threading import Lock
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+def freeze(arguments):
+    """Hashable version of declaration arguments."""
+    if isinstance(arguments, Mapping):
+        return tuple(sorted((key, freeze(value)) for key, value in arguments.items()))
+    if isinstance(arguments, (list, tuple)):
+        return tuple(map(freeze, arguments))
+    return arguments
+
+
+class TopologyCache:
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._declared = {}
+        self._lock = Lock()
+
+    def is_declared(self, connection_key, declaration):
+        return time() - self.ttl < self._declared.get((connection_key, declaration), 0)
+
+    def assert_declared(self, connection_key, declaration, declare):
+        """Call ``declare()`` unless ``declaration`` was asserted on ``connection_key`` within ``ttl``."""
+        if self.is_declared(connection_key, declaration):
+            return False
+        declare()
+        self.mark_declared(connection_key, declaration)
+        return True
+
+    def mark_declared(self, connection_key, declaration):
+        with self._lock:
+            self._declared[(connection_key, declaration)] = time()
+
+    def invalidate(self, connection_key=None):
+        logger.debug('Invalidating declarations of %s', connection_key or 'all connections')
+        with self._lock:
+            if connection_key is None:
+                self._declared.clear()
+                return
+            for key in [key for key in self._declared if key[0] == connection_key]:
+                del self._declared[key]
+
+
+topology_cache = TopologyCache()
@@ -19,7 +19,6 @@ import logging
 from queue_manager.rabbitmq_consumer import RabbitMqConsumer
 
 try:
-    import pika
     from pika.adapters.tornado_connection import TornadoConnection
     from tornado.ioloop import IOLoop
 except ModuleNotFoundError:
@@ -37,18 +36,22 @@ class TornadoConsumer(RabbitMqConsumer):
             raise Exception('Invalid consumer, tornado is not installed')
         super(TornadoConsumer, self).__init__(*args, **kwargs)
 
+    @property
+    def ioloop(self):
+        return IOLoop.current()
+
     def connect(self):
         logger.info('Connecting to %s', self._urls)
-        urls = tuple(map(pika.URLParameters, self._urls))
-        return TornadoConnection.create_connection(urls, self.on_connection_open)
-
-    def reconnect(self):
-        if self._closing:
-            return
+        return TornadoConnection.create_connection(self.connection_urls(), self.on_connection_open)
 
-        # Create a new connection
-        self.connect()
+    def add_callback_threadsafe(self, callback):
+        self._connection.ioloop.add_callback(callback)
 
     def start_listening(self, callback=print):
         self.callback = self.validate_callback(self.callback or callback)
-        IOLoop.instance().add_timeout(5000, self.connect)
+        self._executor = self.setup_executor()
+        self.ioloop.add_callback(self.connect)
+
+    def wait(self):
+        """Run the tornado ioloop until the consumer closes its connection."""
+        self.ioloop.start()
@@ -28,7 +28,7 @@ setup(
     # package_dir={"queue_manager":"queue_manager"},
     extras_require={
         'rabbitmq': ['pika<2'],
-        'pubsub': ['google-cloud-pubsub<2'],
+        'pubsub': ['google-cloud-pubsub>=2'],
     },
     install_requires=[],
     classifiers=[